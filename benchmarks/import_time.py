@@ -0,0 +1,62 @@
+"""
+Import cost of the modules loaded at app startup, measured in fresh interpreters after the framework they go with is
+imported, so only crashless is counted. Exits with an error past the budget:
+
+    python benchmarks/import_time.py --max-ms 20
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+MODULES = {  # module -> what the app has already imported
+    'crashless.capture': '',
+    'crashless.fastapi_handler': 'import fastapi.responses, starlette.requests',
+}
+MEASURE_CODE = '''
+import sys, time, json, tracemalloc
+{setup}
+before = set(sys.modules)
+if {trace_memory}:
+    tracemalloc.start()
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+_, peak = tracemalloc.get_traced_memory()
+print(json.dumps({{'seconds': seconds, 'peak_bytes': peak, 'modules': sorted(set(sys.modules) - before)}}))
+'''
+
+
+def measure(module, setup, trace_memory=False):
+    """Tracing memory slows imports down, so it's measured on its own run."""
+    code = MEASURE_CODE.format(module=module, setup=setup, trace_memory=trace_memory)
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join([SRC_DIR, os.environ.get('PYTHONPATH', '')])}
+    output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import cost of crashless at app startup.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, help='fails when an import takes longer')
+    args = parser.parse_args()
+
+    over_budget = []
+    for module, setup in MODULES.items():
+        runs = [measure(module, setup) for _ in range(args.repeat)]
+        milliseconds = statistics.median(run['seconds'] for run in runs) * 1000
+        peak_kb = measure(module, setup, trace_memory=True)['peak_bytes'] / 1024
+        print(f'{module:<30} {milliseconds:7.2f}ms  {peak_kb:8.0f}KB  {len(runs[0]["modules"])} modules')
+        if args.max_ms is not None and milliseconds > args.max_ms:
+            over_budget.append(module)
+
+    if over_budget:
+        print(f'Over the {args.max_ms}ms budget: {", ".join(over_budget)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
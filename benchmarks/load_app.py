@@ -0,0 +1,67 @@
+import os
+from typing import Dict
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from crashless.metrics import metrics
+
+CRASHLESS_ENABLED = bool(int(os.environ.get("LOAD_HARNESS_CRASHLESS", 1)))
+
+
+class Employee:
+    def __init__(self, name, age):
+        self.name = name
+        self.age = age
+
+
+def find_employee_node(employee, organization_node):
+    if employee == organization_node.employee:
+        return organization_node
+
+    for subordinate_node in organization_node.subordinate_nodes:
+        candidate_node = find_employee_node(employee, subordinate_node)
+        if candidate_node:
+            return candidate_node
+
+    return None
+
+
+def get_level(employee, organization):
+    employee_node = find_employee_node(employee, organization)
+    return employee_node.level if employee_node else None
+
+
+def get_peers(employee, organization):
+    level = get_level(employee, organization)
+    return {employee} if level is not None else set()
+
+
+async def handle_exception_without_crashless(request, exc):
+    return JSONResponse(status_code=500, content={'error': str(exc)})
+
+
+app = FastAPI()
+if CRASHLESS_ENABLED:
+    from crashless import fastapi_handler
+    app.add_exception_handler(Exception, fastapi_handler.handle_exception)
+else:
+    app.add_exception_handler(Exception, handle_exception_without_crashless)
+
+
+@app.get("/healthy")
+def healthy():
+    employees = [Employee(name=f'employee {idx}', age=20 + idx % 40) for idx in range(100)]
+    return {'average_age': sum(e.age for e in employees) / len(employees)}
+
+
+@app.get("/crash")  # This endpoint has a fatal bug :(
+def crash(organization: Dict = None):
+    employee = Employee(name='Pedro', age=42)
+    get_peers(employee=employee, organization=organization)
+    return {'msg': 'success'}
+
+
+@app.get("/metrics")
+def get_metrics():
+    return metrics.get_snapshot()
@@ -0,0 +1,234 @@
+"""
+End-to-end load test of a FastAPI app with and without crashless, against a local stand-in of the fix backend.
+Fires concurrent healthy and crashing requests, and reports the latency of both, the app's threads and RSS over time,
+and what the backend received:
+
+    python benchmarks/load_harness.py --requests 2000 --concurrency 32 --crash-ratio 0.2 --backend-latency 2
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+SRC_DIR = os.path.join(REPO_DIR, 'src')
+for path in (REPO_DIR, SRC_DIR):  # the stand-in backend is shared with the tests.
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from tests.stand_in_backend import StandInBackend
+
+HEALTHY = 'healthy'
+CRASH = 'crash'
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_backend(latency, failure_rate):
+    # the backend answers full payloads only, content addressed ones fall back to them.
+    return StandInBackend(latency=latency, failure_rate=failure_rate, supports_blobs=False).start()
+
+
+def start_app(port, backend_url, crashless_enabled):
+    env = {
+        **os.environ,
+        'PYTHONPATH': os.pathsep.join([SRC_DIR, BENCHMARKS_DIR, os.environ.get('PYTHONPATH', '')]),
+        'LOAD_HARNESS_CRASHLESS': str(int(crashless_enabled)),
+        'CRASHLESS_BACKEND_DOMAIN': backend_url,
+    }
+    command = [sys.executable, '-m', 'uvicorn', 'load_app:app', '--port', str(port), '--log-level', 'warning',
+               '--no-access-log']
+    process = subprocess.Popen(command, cwd=BENCHMARKS_DIR, env=env, stdin=subprocess.DEVNULL,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/healthy', timeout=1)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('The app did not start')
+
+
+def read_process_status(pid):
+    """Threads and RSS in MB, from /proc, None where there's no /proc."""
+    try:
+        with open(f'/proc/{pid}/status') as file:
+            status = dict(line.split(':', 1) for line in file if ':' in line)
+    except OSError:
+        return None
+    return int(status['Threads']), int(status['VmRSS'].split()[0]) / 1024
+
+
+class ProcessSampler(threading.Thread):
+    def __init__(self, pid, interval):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (seconds since start, threads, rss in MB)
+        self.stopped = threading.Event()
+
+    def run(self):
+        start = time.monotonic()
+        while not self.stopped.is_set():
+            status = read_process_status(self.pid)
+            if status is not None:
+                self.samples.append((round(time.monotonic() - start, 3), *status))
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def get_percentile(values, percentile):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+
+def get_latency_stats(latencies, errors):
+    return {
+        'count': len(latencies),
+        'errors': errors,
+        'p50_ms': get_percentile(latencies, 50) * 1000 if latencies else None,
+        'p99_ms': get_percentile(latencies, 99) * 1000 if latencies else None,
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else None,
+    }
+
+
+def fire_requests(base_url, kinds, concurrency):
+    """Returns the latencies and the connection errors of each kind of request."""
+    local = threading.local()
+
+    def send(kind):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        # the server closes the connection after an unhandled exception, so crashes don't reuse it.
+        headers = {'connection': 'close'} if kind == CRASH else None
+        start = time.perf_counter()
+        try:
+            session.get(f'{base_url}/{kind}', headers=headers, timeout=60)
+        except requests.ConnectionError:
+            local.session = None
+            return kind, None
+        return kind, time.perf_counter() - start
+
+    latencies = {HEALTHY: [], CRASH: []}
+    errors = {HEALTHY: 0, CRASH: 0}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for kind, latency in executor.map(send, kinds):
+            if latency is None:
+                errors[kind] += 1
+            else:
+                latencies[kind].append(latency)
+    return latencies, errors
+
+
+def run_scenario(args, crashless_enabled):
+    backend = start_backend(args.backend_latency, args.backend_failure_rate)
+    backend_url = backend.url
+    port = get_free_port()
+    process = start_app(port, backend_url, crashless_enabled)
+    sampler = ProcessSampler(process.pid, args.sample_interval)
+    sampler.start()
+    try:
+        random.seed(args.seed)
+        kinds = [CRASH if random.random() < args.crash_ratio else HEALTHY for _ in range(args.requests)]
+        start = time.perf_counter()
+        latencies, errors = fire_requests(f'http://127.0.0.1:{port}', kinds, args.concurrency)
+        duration = time.perf_counter() - start
+        time.sleep(args.settle)  # lets the analyses still queued reach the backend.
+        app_metrics = requests.get(f'http://127.0.0.1:{port}/metrics', timeout=10).json()
+    finally:
+        sampler.stop()
+        process.terminate()
+        process.wait(timeout=10)
+        backend.stop()
+
+    return {
+        'duration_s': duration,
+        'requests_per_s': len(kinds) / duration,
+        HEALTHY: get_latency_stats(latencies[HEALTHY], errors[HEALTHY]),
+        CRASH: get_latency_stats(latencies[CRASH], errors[CRASH]),
+        'threads_max': max((threads for _, threads, _ in sampler.samples), default=None),
+        'rss_max_mb': max((rss for _, _, rss in sampler.samples), default=None),
+        'samples': sampler.samples,
+        'backend': {'requests': backend.requests, 'failures': backend.failures,
+                    'received_bytes': backend.received_bytes},
+        'app_metrics': app_metrics,
+    }
+
+
+def get_overhead(results):
+    """Crashless on minus off, on each latency."""
+    overhead = dict()
+    for kind in (HEALTHY, CRASH):
+        for stat in ('p50_ms', 'p99_ms'):
+            on, off = results['on'][kind][stat], results['off'][kind][stat]
+            if on is not None and off is not None:
+                overhead[f'{kind}_{stat}'] = on - off
+    return overhead
+
+
+def print_results(results):
+    for scenario, result in results.items():
+        if scenario == 'overhead':
+            continue
+        print(f"crashless {scenario}: {result['requests_per_s']:.0f} req/s, threads max {result['threads_max']}, "
+              f"RSS max {result['rss_max_mb']} MB, backend requests {result['backend']['requests']}")
+        for kind in (HEALTHY, CRASH):
+            stats = result[kind]
+            if stats['count']:
+                print(f"    {kind:<8} n={stats['count']:<6} p50 {stats['p50_ms']:8.2f}ms  "
+                      f"p99 {stats['p99_ms']:8.2f}ms  errors {stats['errors']}")
+    for name, value in results.get('overhead', dict()).items():
+        print(f'overhead {name}: {value:+.2f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of a FastAPI app with and without crashless.')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--crash-ratio', type=float, default=0.2, help='share of crashing requests')
+    parser.add_argument('--backend-latency', type=float, default=1, help='seconds the backend takes per fix')
+    parser.add_argument('--backend-failure-rate', type=float, default=0.1)
+    parser.add_argument('--sample-interval', type=float, default=0.2, help='seconds between threads and RSS samples')
+    parser.add_argument('--settle', type=float, default=1, help='seconds to wait for queued analyses at the end')
+    parser.add_argument('--scenarios', nargs='+', choices=['on', 'off'], default=['off', 'on'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', default='load-latest', help='name of the results file')
+    args = parser.parse_args()
+
+    results = {scenario: run_scenario(args, crashless_enabled=scenario == 'on') for scenario in args.scenarios}
+    if 'on' in results and 'off' in results:
+        results['overhead'] = get_overhead(results)
+    results['args'] = vars(args)
+    print_results({key: value for key, value in results.items() if key != 'args'})
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, f'{args.save}.json'), 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
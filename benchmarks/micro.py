@@ -0,0 +1,178 @@
+"""
+Micro-benchmarks of the crash handling stages over a synthetic project: deep import graphs, a big file and a deep
+recursive traceback. Timings and payload sizes are stored in benchmarks/results, and can be compared with a previous
+run to catch regressions:
+
+    python benchmarks/micro.py --save baseline
+    python benchmarks/micro.py --compare baseline
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tempfile
+
+from synthetic import generate_project, get_crashes
+
+from crashless.packer import pack
+from crashless.metrics import metrics
+from crashless.sources import get_code_lines, get_source_file
+from crashless.snapshot import take_snapshot
+from crashless.handler import (get_environments_and_defs, get_definitions, get_context_code_lines, get_payload,
+                               get_diffs_and_patch)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+MIN_REGRESSION_SECONDS = 0.001  # differences below this are noise.
+
+
+def measure(function, *args, repeat=5):
+    """Returns the timings of the first call, where caches are cold, and of the following calls."""
+    timings = []
+    for _ in range(repeat + 1):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return {'first': timings[0], 'min': min(timings[1:]), 'median': statistics.median(timings[1:])}
+
+
+def get_crashing_definitions(snapshot):
+    frame = snapshot.user_frames[-1]
+    source_file = get_source_file(frame.file_path)
+    _, start_scope_index, end_scope_index = get_context_code_lines(frame.line_number, source_file)
+    return get_definitions(frame, source_file, start_scope_index, end_scope_index)
+
+
+def get_edited_code(code, every_n_lines=500):
+    lines = code.split('\n')
+    for idx in range(0, len(lines), every_n_lines):
+        lines[idx] = f'{lines[idx]}  # edited'
+    return '\n'.join(lines)
+
+
+def run_scenario(exc, repeat):
+    timings = {'take_snapshot': measure(take_snapshot, exc, repeat=repeat)}
+    snapshot = take_snapshot(exc)
+    timings['get_environments_and_defs'] = measure(get_environments_and_defs, snapshot, repeat=repeat)
+    timings['get_definitions'] = measure(get_crashing_definitions, snapshot, repeat=repeat)
+
+    environments, definitions = get_environments_and_defs(snapshot)
+    fixed_size = len(snapshot.stacktrace_str)
+    timings['pack'] = measure(pack, environments, definitions, fixed_size, repeat=repeat)
+
+    payload, _ = get_payload(snapshot)
+    sizes = {
+        'frames': len(snapshot.frames),
+        'environments': len(environments),
+        'definitions': len(definitions),
+        'packed_environments': len(payload.environments),
+        'packed_definitions': len(payload.additional_definitions),
+        'payload_chars': len(payload.json()),
+    }
+    return timings, sizes
+
+
+def run(args):
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'modules': args.modules,
+            'functions': args.functions,
+            'big_file_lines': args.big_file_lines,
+            'recursion_depth': args.recursion_depth,
+        },
+        'timings': dict(),
+        'sizes': dict(),
+    }
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root:
+        root = os.path.realpath(root)
+        os.chdir(root)  # user code is the code under the working directory.
+        try:
+            package_path = generate_project(root, args.modules, args.functions, args.big_file_lines)
+            for scenario, exc in get_crashes(args.recursion_depth).items():
+                timings, sizes = run_scenario(exc, args.repeat)
+                results['timings'].update({f'{scenario}.{name}': timing for name, timing in timings.items()})
+                results['sizes'][scenario] = sizes
+
+            with open(os.path.join(package_path, 'big_file.py')) as file:
+                big_code = file.read()
+            edited_code = get_edited_code(big_code)
+            big_file_path = os.path.join(package_path, 'big_file.py')
+            results['timings']['get_code_lines'] = measure(get_code_lines, big_code, repeat=args.repeat)
+            results['timings']['get_diffs_and_patch'] = measure(get_diffs_and_patch, big_code, edited_code,
+                                                                big_file_path, repeat=args.repeat)
+        finally:
+            os.chdir(cwd)
+
+    results['stages'] = metrics.get_snapshot()['timings']  # where the time went, across all the runs.
+    return results
+
+
+def get_results_path(name):
+    return os.path.join(RESULTS_DIR, f'{name}.json')
+
+
+def save(results, name):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(get_results_path(name), 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+def compare(results, baseline, tolerance):
+    """Returns the regressions: stages slower than the tolerance allows and payloads that grew."""
+    regressions = []
+    for name, timing in results['timings'].items():
+        baseline_timing = baseline['timings'].get(name)
+        if baseline_timing is None:
+            continue
+        old, new = baseline_timing['median'], timing['median']
+        if new > old * (1 + tolerance) and new - old > MIN_REGRESSION_SECONDS:
+            regressions.append(f'{name}: {old * 1000:.2f}ms -> {new * 1000:.2f}ms')
+
+    for scenario, sizes in results['sizes'].items():
+        old = baseline['sizes'].get(scenario, dict()).get('payload_chars')
+        new = sizes['payload_chars']
+        if old is not None and new > old:
+            regressions.append(f'{scenario}.payload_chars: {old} -> {new}')
+
+    return regressions
+
+
+def print_results(results):
+    for name, timing in sorted(results['timings'].items()):
+        print(f"{name:<45} first {timing['first'] * 1000:9.2f}ms  median {timing['median'] * 1000:9.2f}ms")
+    for scenario, sizes in sorted(results['sizes'].items()):
+        print(f'{scenario:<45} ' + '  '.join(f'{key} {value}' for key, value in sorted(sizes.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the crash handling stages on a synthetic project.')
+    parser.add_argument('--modules', type=int, default=30, help='modules in the import chain')
+    parser.add_argument('--functions', type=int, default=20, help='functions per module')
+    parser.add_argument('--big-file-lines', type=int, default=10_000)
+    parser.add_argument('--recursion-depth', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save', default='latest', help='name of the results file')
+    parser.add_argument('--compare', help='name of the results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown')
+    args = parser.parse_args()
+
+    results = run(args)
+    print_results(results)
+    save(results, args.save)
+
+    if args.compare:
+        with open(get_results_path(args.compare)) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
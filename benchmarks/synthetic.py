@@ -0,0 +1,124 @@
+import os
+import sys
+import importlib
+
+PACKAGE_NAME = 'synthetic_app'
+
+
+def get_module_code(idx, modules, functions):
+    """A module with a class and a chain of functions, the last one calls into the next module."""
+    is_last = idx == modules - 1
+    lines = []
+    if not is_last:
+        lines += [f'from {PACKAGE_NAME} import module_{idx + 1}', '', '']
+
+    lines += [
+        f'class Record{idx}:',
+        f'    def __init__(self, value):',
+        f'        self.value = value',
+        f'        self.history = [value] * 10',
+        '',
+        f'    def total(self):',
+        f'        return sum(self.history)',
+        '',
+        '',
+    ]
+    for function_idx in range(functions):
+        lines += [f'def function_{function_idx}(record, depth):',
+                  f'    values = [record.value * i for i in range({function_idx + 1})]',
+                  f'    total = record.total() + sum(values)']
+        if function_idx < functions - 1:
+            lines.append(f'    return function_{function_idx + 1}(record, depth) + total')
+        elif is_last:
+            lines.append(f'    return total + record.missing_attribute')
+        else:
+            lines.append(f'    return module_{idx + 1}.entry(depth) + total')
+        lines += ['', '']
+
+    lines += [f'def entry(depth):',
+              f'    record = Record{idx}(depth)',
+              f'    return function_0(record, depth)',
+              '']
+    return '\n'.join(lines)
+
+
+def get_big_file_code(lines_count):
+    """Many small functions, the crash is in the last one."""
+    lines = []
+    idx = 0
+    while len(lines) < lines_count - 8:
+        lines += [f'def helper_{idx}(value):',
+                  f'    """Helper number {idx}"""',
+                  f'    result = value + {idx}',
+                  f'    return result',
+                  '',
+                  '']
+        idx += 1
+
+    lines += ['def crash(value):',
+              f'    total = helper_0(value) + helper_{idx - 1}(value)',
+              f'    return total / 0',
+              '']
+    return '\n'.join(lines)
+
+
+def get_recursive_code():
+    return '\n'.join([
+        'def recurse(depth, data):',
+        '    if depth == 0:',
+        "        return data['missing_key']",
+        '    return recurse(depth - 1, data)',
+        '',
+    ])
+
+
+def write_file(path, content):
+    with open(path, 'w') as file:
+        file.write(content)
+
+
+def generate_project(root, modules=30, functions=20, big_file_lines=10_000):
+    """
+    Writes a synthetic package to root: a chain of modules importing each other, a file with big_file_lines lines
+    and a recursive function, and makes it importable.
+    """
+    package_path = os.path.join(root, PACKAGE_NAME)
+    os.makedirs(package_path, exist_ok=True)
+    write_file(os.path.join(package_path, '__init__.py'), '')
+    for idx in range(modules):
+        write_file(os.path.join(package_path, f'module_{idx}.py'), get_module_code(idx, modules, functions))
+    write_file(os.path.join(package_path, 'big_file.py'), get_big_file_code(big_file_lines))
+    write_file(os.path.join(package_path, 'recursive.py'), get_recursive_code())
+
+    for name in [name for name in sys.modules if name == PACKAGE_NAME or name.startswith(f'{PACKAGE_NAME}.')]:
+        del sys.modules[name]
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    importlib.invalidate_caches()
+    return package_path
+
+
+def catch(function, *args):
+    try:
+        function(*args)
+    except Exception as e:
+        return e
+    raise AssertionError(f'{function.__name__} was expected to crash')
+
+
+def get_crashes(recursion_depth=1000):
+    """Runs each scenario of the synthetic project and returns the exception it raises."""
+    module_0 = importlib.import_module(f'{PACKAGE_NAME}.module_0')
+    big_file = importlib.import_module(f'{PACKAGE_NAME}.big_file')
+    recursive = importlib.import_module(f'{PACKAGE_NAME}.recursive')
+
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursion_limit, recursion_depth + 500))
+    try:
+        return {
+            'deep_imports': catch(module_0.entry, 1),
+            'big_file': catch(big_file.crash, 1),
+            'recursion': catch(recursive.recurse, recursion_depth, {'key': 'value'}),
+        }
+    finally:
+        sys.setrecursionlimit(recursion_limit)
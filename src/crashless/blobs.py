@@ -0,0 +1,120 @@
+import json
+import hashlib
+
+MISSING_BLOBS_PATH = '/crashless/missing-blobs'
+CRASH_FIX_BY_HASH_PATH = '/crashless/get-crash-fix-by-hash'
+OK = 200
+NOT_FOUND = 404
+CONFLICT = 409  # the backend answers it, with the missing hashes, if it lost blobs between both requests.
+MAX_ATTEMPTS = 2
+
+_is_supported = True
+
+
+def is_supported():
+    return _is_supported
+
+
+def set_unsupported():
+    """Older backends don't know the protocol, the full payload is sent to them from then on."""
+    global _is_supported
+    _is_supported = False
+
+
+def get_code_hash(code):
+    return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+
+def dumps(data):
+    """Canonical json, the same payload always has the same bytes."""
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+def get_content_addressed_payload(payload_dict):
+    """Replaces every code by its hash, in canonical order. Returns the payload and the dict of hash -> code."""
+    blobs = dict()
+
+    def replace_code(code_dict):
+        code_dict = dict(code_dict)
+        code = code_dict.pop('code')
+        code_hash = get_code_hash(code)
+        blobs[code_hash] = code
+        code_dict['code_hash'] = code_hash
+        return code_dict
+
+    content_addressed_payload = {
+        **payload_dict,
+        'packages': sorted(payload_dict['packages']),
+        'environments': sorted((replace_code(e) for e in payload_dict['environments']), key=lambda e: e['index']),
+        'additional_definitions': {name: replace_code(d)
+                                   for name, d in sorted(payload_dict['additional_definitions'].items())},
+    }
+    return content_addressed_payload, blobs
+
+
+def get_missing_blobs_data(blobs):
+    return dumps({'hashes': sorted(blobs)})
+
+
+def get_crash_fix_data(content_addressed_payload, blobs, missing_hashes):
+    return dumps({**content_addressed_payload, 'blobs': {h: blobs[h] for h in missing_hashes if h in blobs}})
+
+
+def get_missing_hashes(response, status_code):
+    """The hashes the backend asks for, None when its answer can't be used, then the full payload is sent."""
+    if response.status_code != status_code:
+        return None
+    try:
+        missing_hashes = response.json().get('missing')
+    except (ValueError, AttributeError):  # not json, or not an object.
+        return None
+    return missing_hashes if isinstance(missing_hashes, list) else None
+
+
+def get_requests(payload_dict):
+    """
+    The protocol without its IO, shared by the sync and async senders: yields the (path, data) of each request and gets
+    back its response. Returns the fix response, or None when the full payload has to be sent instead.
+    """
+    content_addressed_payload, blobs = get_content_addressed_payload(payload_dict)
+    response = yield MISSING_BLOBS_PATH, get_missing_blobs_data(blobs)
+    if response.status_code == NOT_FOUND:
+        set_unsupported()
+        return None
+
+    missing_hashes = get_missing_hashes(response, OK)
+    for _ in range(MAX_ATTEMPTS):
+        if missing_hashes is None:
+            return None
+        response = yield CRASH_FIX_BY_HASH_PATH, get_crash_fix_data(content_addressed_payload, blobs, missing_hashes)
+        if response.status_code != CONFLICT:
+            return response
+        missing_hashes = get_missing_hashes(response, CONFLICT)
+    return None
+
+
+def send_payload(client, payload_dict, headers):
+    """
+    Asks the backend which code blocks it's missing (have/want) and sends only those, the rest go by hash. Returns None
+    when the full payload has to be sent instead.
+    """
+    requests = get_requests(payload_dict)
+    response = None
+    while True:
+        try:
+            path, data = requests.send(response)
+        except StopIteration as stop:
+            return stop.value
+        response = client.post(path, data, headers=headers)
+
+
+async def send_payload_async(client, payload_dict, headers):
+    """Same as send_payload, with an async client"""
+    requests = get_requests(payload_dict)
+    response = None
+    while True:
+        try:
+            path, data = requests.send(response)
+        except StopIteration as stop:
+            return stop.value
+        response = await client.post(path, data, headers=headers)
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+from crashless.cts import FIX_CACHE_SIZE, FIX_CACHE_TTL, FIX_CACHE_DIR
+from crashless.metrics import metrics
+
+
+def get_relative_path(file_path):
+    """Paths are made relative to the project, so the same crash has the same fingerprint on every machine."""
+    try:
+        return os.path.relpath(file_path, os.getcwd())
+    except ValueError:  # on windows, different drives have no relative path.
+        return file_path
+
+
+def get_exception_name(exc):
+    exc_type = type(exc)
+    return f'{exc_type.__module__}.{exc_type.__qualname__}'
+
+
+def get_crash_fingerprint(exception_name, frames):
+    """Stable id of a crash: the exception type plus the (file, function, line) of every user code frame."""
+    digest = hashlib.sha256(exception_name.encode('utf-8'))
+    for file_path, function_name, line_number in frames:
+        digest.update(f'\n{get_relative_path(file_path)}:{function_name}:{line_number}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def get_source_hash(codes):
+    digest = hashlib.sha256()
+    for code in codes:
+        digest.update(code.encode('utf-8', errors='replace'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def get_fix_fingerprint(crash_fingerprint, codes):
+    """A fix is only valid for the code it was computed on, so the involved source is part of the key."""
+    return hashlib.sha256(f'{crash_fingerprint}:{get_source_hash(codes)}'.encode('utf-8')).hexdigest()
+
+
+class DirectoryStore:
+    """On disk backing store, one json file per key, so cached fixes survive restarts."""
+
+    def __init__(self, path, ttl=FIX_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        os.makedirs(path, exist_ok=True)
+
+    def get_file_path(self, key):
+        return os.path.join(self.path, f'{key}.json')
+
+    def get(self, key):
+        file_path = self.get_file_path(key)
+        try:
+            with open(file_path, 'r') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - entry['created_at'] > self.ttl:
+            self.delete(key)
+            return None
+        return entry['value']
+
+    def set(self, key, value):
+        entry = {'created_at': time.time(), 'value': value}
+        # Writes to a temp file and renames, so readers never see half written entries.
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'w') as file:
+                json.dump(entry, file)
+            os.replace(temp_path, self.get_file_path(key))
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def delete(self, key):
+        try:
+            os.remove(self.get_file_path(key))
+        except OSError:
+            pass
+
+
+class FixCache:
+    """LRU cache with TTL of backend responses, optionally backed by a persistent store."""
+
+    def __init__(self, max_size=FIX_CACHE_SIZE, ttl=FIX_CACHE_TTL, backing_store=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backing_store = backing_store
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self._get(key)
+        metrics.increment('fix_cache_hits' if value is not None else 'fix_cache_misses')
+        return value
+
+    def _get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if now < expires_at:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+
+        value = self.backing_store.get(key) if self.backing_store is not None else None
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._set_in_memory(key, value, now)
+        return value
+
+    def set(self, key, value):
+        with self.lock:
+            self._set_in_memory(key, value, time.monotonic())
+        if self.backing_store is not None:
+            self.backing_store.set(key, value)
+
+    def _set_in_memory(self, key, value, now):
+        self.entries[key] = (now + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)  # evicts the least recently used.
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_fix_cache = None
+_fix_cache_lock = threading.Lock()
+
+
+def get_fix_cache():
+    global _fix_cache
+    if _fix_cache is None:
+        with _fix_cache_lock:
+            if _fix_cache is None:
+                from crashless.store import get_store  # sqlite is only imported by the analysis.
+
+                backing_store = get_store()  # shared by all the processes, when set.
+                if backing_store is None and FIX_CACHE_DIR:
+                    backing_store = DirectoryStore(FIX_CACHE_DIR)
+                _fix_cache = FixCache(backing_store=backing_store)
+    return _fix_cache
@@ -0,0 +1,60 @@
+import importlib
+import threading
+
+from crashless.cts import PREWARM
+from crashless.snapshot import take_snapshot
+from crashless.workers import AnalysisPool, AsyncAnalysisPool
+
+HANDLER_MODULE = 'crashless.handler'  # the analysis, network and UI, only imported on the first crash.
+
+
+def import_handler():
+    return importlib.import_module(HANDLER_MODULE)
+
+
+def prewarm():
+    """Imports the handler in the background, so the first crash doesn't wait for it."""
+    thread = threading.Thread(target=import_handler, name='crashless-prewarm', daemon=True)
+    thread.start()
+    return thread
+
+
+def analyze(snapshot):
+    import_handler().threaded_function(snapshot)
+
+
+async def analyze_async(snapshot):
+    import asyncio  # only async apps analyze here, and they have already imported asyncio.
+
+    handler = await asyncio.get_running_loop().run_in_executor(None, import_handler)  # imports don't block the loop.
+    await handler.async_function(snapshot)
+
+
+analysis_pool = AnalysisPool(function=analyze)
+async_analysis_pool = AsyncAnalysisPool(function=analyze_async)
+
+
+def submit_exception(exc):
+    """
+    Queues a snapshot of the exception for analysis, returns False when it was dropped or merged with an equal crash.
+    The exception isn't kept, so its frames are released as soon as the request is done with them.
+    """
+    snapshot = take_snapshot(exc)
+    return analysis_pool.submit(snapshot.fingerprint, snapshot)
+
+
+def submit_exception_async(exc):
+    """Same as submit_exception, for code running on an event loop. Analyses run as tasks of that loop."""
+    snapshot = take_snapshot(exc)
+    return async_analysis_pool.submit(snapshot.fingerprint, snapshot)
+
+
+def get_content_message(exc):
+    return {
+        'error': str(exc),
+        'action': 'Check terminal to see a possible solution',
+    }
+
+
+if PREWARM:
+    prewarm()
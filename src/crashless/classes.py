@@ -0,0 +1,184 @@
+import ast
+import sys
+import typing
+import inspect
+import weakref
+from collections import deque
+
+from crashless.sources import get_source_file
+from crashless.symbols import path_is_in_user_code
+
+FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+FIELDS_METHODS = ('__init__', '__post_init__')  # where instance fields are set, always sent.
+outlines_cache = weakref.WeakKeyDictionary()  # class -> ClassOutline
+
+
+def get_node_start_line(node):
+    """Decorators are part of the definition."""
+    return min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+
+
+def find_class_node(tree, the_class):
+    """Follows the qualified name, ie: Outer.Inner, classes defined in functions are found by their first line."""
+    if '<locals>' in the_class.__qualname__:
+        _, first_line = inspect.getsourcelines(the_class)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ClassDef) and first_line in (node.lineno, get_node_start_line(node)):
+                return node
+        return None
+
+    node = tree
+    for name in the_class.__qualname__.split('.'):
+        node = next((child for child in node.body if isinstance(child, ast.ClassDef) and child.name == name), None)
+        if node is None:
+            return None
+    return node
+
+
+def get_statement_name(statement):
+    """Name a class body statement defines, ie: the field of `table = 'employees'`, or its first line."""
+    if isinstance(statement, ast.ClassDef):
+        return statement.name
+    targets = statement.targets if isinstance(statement, ast.Assign) else [getattr(statement, 'target', None)]
+    names = [target.id for target in targets if isinstance(target, ast.Name)]
+    return names[0] if names else f'line_{statement.lineno}'
+
+
+class ClassOutline:
+    """
+    Line ranges, 1 based and inclusive, of a class: its header with the fields declared before the first method, each
+    of its methods, and each statement after the first method that isn't one, ie: a field declared between methods.
+    Ranges are exact, so a fix to any of them can be patched back into the file.
+    """
+    __slots__ = ('source_file', 'header_bounds', 'methods', 'fields')
+
+    def __init__(self, source_file, node):
+        self.source_file = source_file
+        self.methods = dict()  # name -> (first line, last line)
+        self.fields = dict()  # name -> (first line, last line), of the statements after the first method.
+        # on python 3.8 keywords, ie: metaclass=Meta, have no end line, their values do.
+        header_end = max([node.lineno] + [base.end_lineno for base in node.bases] +
+                         [keyword.value.end_lineno for keyword in node.keywords])
+        for statement in node.body:
+            if isinstance(statement, FUNCTION_NODES):
+                first_line, _ = self.methods.get(statement.name, (get_node_start_line(statement), None))
+                self.methods[statement.name] = (first_line, statement.end_lineno)  # ie: a property and its setter.
+            elif not self.methods:
+                header_end = statement.end_lineno
+            else:
+                first_line = get_node_start_line(statement) if isinstance(statement, ast.ClassDef) else statement.lineno
+                self.fields[get_statement_name(statement)] = (first_line, statement.end_lineno)
+        self.header_bounds = (get_node_start_line(node), header_end)
+
+
+def get_class_outline(the_class):
+    """A class' file is parsed once, and again only when the file changes. None for classes without source."""
+    try:
+        source_file = get_source_file(inspect.getfile(the_class))
+    except (TypeError, OSError):
+        return None
+
+    outline = outlines_cache.get(the_class)
+    if outline is None or outline.source_file is not source_file:
+        try:
+            node = find_class_node(source_file.tree, the_class)
+        except (TypeError, OSError, SyntaxError):
+            return None
+        if node is None:
+            return None
+        outline = ClassOutline(source_file, node)
+        outlines_cache[the_class] = outline
+    return outline
+
+
+def get_qualified_name(obj):
+    """Of a class or a function, ie: module.Class.method"""
+    return f'{obj.__module__}.{obj.__qualname__}'
+
+
+def is_user_class(the_class):
+    try:
+        return path_is_in_user_code(inspect.getfile(the_class))
+    except TypeError:  # builtins
+        return False
+
+
+def get_annotated_classes(annotation, module_dict):
+    """Classes in an annotation, ie: Optional[List['Employee']] -> [Employee]"""
+    if isinstance(annotation, str):
+        annotation = module_dict.get(annotation)
+    if inspect.isclass(annotation):
+        return [annotation]
+    return [the_class for arg in typing.get_args(annotation) for the_class in get_annotated_classes(arg, module_dict)]
+
+
+def get_attribute_classes(the_class):
+    """User defined classes of the annotated fields."""
+    module = sys.modules.get(the_class.__module__)
+    module_dict = getattr(module, '__dict__', dict())
+    annotations = the_class.__dict__.get('__annotations__', dict())
+    return [attribute_class for annotation in annotations.values()
+            for attribute_class in get_annotated_classes(annotation, module_dict) if is_user_class(attribute_class)]
+
+
+def get_related_classes(local_classes):
+    """
+    Breadth first walk from the local classes to their user defined bases, following the MRO, and to the classes of
+    their annotated fields. Returns (class, distance) of each, visited once.
+    """
+    related_classes = dict()
+    worklist = deque((the_class, 1) for the_class in local_classes)
+    while worklist:
+        the_class, distance = worklist.popleft()
+        if the_class in related_classes:
+            continue
+        related_classes[the_class] = distance
+        worklist.extend((base, distance + 1) for base in the_class.__mro__[1:] if is_user_class(base))
+        worklist.extend((attribute_class, distance + 1) for attribute_class in get_attribute_classes(the_class))
+    return list(related_classes.items())
+
+
+def resolve_method(the_class, name):
+    """The class in the MRO that defines the method, with its outline."""
+    for base in the_class.__mro__:
+        if name in base.__dict__:
+            outline = get_class_outline(base) if is_user_class(base) else None
+            if outline is None or name not in outline.methods:
+                return None, None
+            return base, outline
+    return None, None
+
+
+def get_class_members(local_classes, used_names):
+    """
+    (name, source file, first line, last line, distance) of the header and fields of each related class, and of the
+    methods reached from the used names. Names used by the reached methods, ie: self.helper(), are followed too.
+    """
+    members = dict()
+    related_classes = get_related_classes(local_classes)
+    for the_class, distance in related_classes:
+        outline = get_class_outline(the_class)
+        if outline is not None:
+            name = get_qualified_name(the_class)  # classes of different modules can have the same name.
+            members[name] = (name, outline.source_file, *outline.header_bounds, distance)
+            for field_name, (first_line, last_line) in outline.fields.items():
+                members[f'{name}.{field_name}'] = (f'{name}.{field_name}', outline.source_file, first_line, last_line,
+                                                   distance)
+
+    visited_names = set()
+    worklist = deque((name, 1) for name in (*FIELDS_METHODS, *used_names))
+    while worklist:
+        name, depth = worklist.popleft()
+        if name in visited_names:
+            continue
+        visited_names.add(name)
+        for the_class, distance in related_classes:
+            base, outline = resolve_method(the_class, name)
+            member_name = f'{get_qualified_name(base)}.{name}' if base is not None else None
+            if member_name is None or member_name in members:
+                continue
+            first_line, last_line = outline.methods[name]
+            members[member_name] = (member_name, outline.source_file, first_line, last_line, distance + depth - 1)
+            worklist.extend((used_name, depth + 1)
+                            for used_name in outline.source_file.get_attribute_names(first_line, last_line))
+    return list(members.values())
@@ -0,0 +1,94 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from halo import Halo
+
+from crashless.cts import SPOOL_DIR, SPOOL_BATCH_SIZE, SPOOL_MAX_ATTEMPTS, BACKEND_POOL_SIZE
+from crashless.spool import Spool, read_segment
+from crashless.handler import (Payload, Solution, BColors, get_cached_code_fix, get_solution_from_code_fix,
+                               show_solution, print_with_color, print_diff, add_newline_every_n_chars,
+                               get_str_with_color)
+
+
+def get_unique_records(records):
+    """Crashes with the same fingerprint get the same fix, so only the first of each is sent."""
+    unique_records = dict()
+    counts = dict()
+    for record in records:
+        fingerprint = record['fingerprint']
+        counts[fingerprint] = counts.get(fingerprint, 0) + record.get('count', 1)  # retried records keep their count.
+        unique_records.setdefault(fingerprint, record)
+    return list(unique_records.values()), counts
+
+
+def get_batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def get_record_solution(record):
+    try:
+        payload = Payload(**record['payload'])
+        code_fix = get_cached_code_fix(payload, record['fingerprint'], show_spinner=False)
+        return get_solution_from_code_fix(payload, code_fix)
+    except Exception as error:  # a broken record can't stop the replay.
+        return Solution(error=f'Failed replay with {error=}')
+
+
+def show_record_solution(solution, count, apply):
+    print_with_color(f'Crash seen {count} time(s):', BColors.HEADER)
+    if apply or not solution.diffs:
+        show_solution(solution)
+        return
+
+    print(f'In {solution.file_path}:')
+    for diff in solution.diffs:
+        print_diff(diff)
+    print_with_color(f'Explanation: {add_newline_every_n_chars(solution.explanation)}', BColors.OKBLUE)
+
+
+def replay(spool, batch_size=SPOOL_BATCH_SIZE, workers=BACKEND_POOL_SIZE, apply=False):
+    """
+    Sends the spooled crashes to the backend, deduplicated by fingerprint and in batches of concurrent requests.
+    Crashes whose fix failed go back to the spool, until they fail max attempts times. Returns the number of
+    crashes sent and failed.
+    """
+    claimed_paths = spool.claim_segments()
+    records, counts = get_unique_records(record for path in claimed_paths for record in read_segment(path))
+
+    sent = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in get_batches(records, batch_size):
+            with Halo(text=get_str_with_color(f'Replaying {len(batch)} crash(es)', BColors.WARNING), spinner='dots'):
+                solutions = list(executor.map(get_record_solution, batch))
+
+            for record, solution in zip(batch, solutions):
+                sent += 1
+                attempts = record.get('attempts', 0) + 1
+                if solution.error is not None and attempts < SPOOL_MAX_ATTEMPTS:
+                    failed += 1
+                    spool.append({**record, 'attempts': attempts, 'count': counts[record['fingerprint']]})
+                    continue
+                show_record_solution(solution, counts[record['fingerprint']], apply)
+
+    spool.release_segments(claimed_paths)
+    return sent, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='crashless', description='Crashless command line')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    replay_parser = subparsers.add_parser('replay', help='sends the spooled crashes and shows their fixes')
+    replay_parser.add_argument('--spool-dir', default=SPOOL_DIR)
+    replay_parser.add_argument('--batch-size', type=int, default=SPOOL_BATCH_SIZE)
+    replay_parser.add_argument('--workers', type=int, default=BACKEND_POOL_SIZE, help='concurrent requests')
+    replay_parser.add_argument('--apply', action='store_true', help='asks to apply each fix')
+    args = parser.parse_args(argv)
+
+    if args.command == 'replay':
+        sent, failed = replay(Spool(args.spool_dir), args.batch_size, args.workers, args.apply)
+        print(f'Replayed {sent} crash(es), {failed} failed and will be retried.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+import gzip
+import time
+import uuid
+import random
+import asyncio
+import functools
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from crashless.cts import (BACKEND_DOMAIN, BACKEND_POOL_SIZE, BACKEND_COMPRESSION, BACKEND_CONNECT_TIMEOUT,
+                           BACKEND_READ_TIMEOUT, BACKEND_DEADLINE, BACKEND_MAX_RETRIES, BACKEND_RETRY_BACKOFF)
+from crashless.metrics import metrics
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, gzip is used without it.
+    zstandard = None
+
+try:
+    import httpx
+except ImportError:  # optional dependency, the async client falls back to the sync one on an executor.
+    httpx = None
+
+MIN_COMPRESSION_SIZE = 1024  # in bytes, smaller bodies aren't worth it.
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+BAD_REQUEST = 400
+UNSUPPORTED_MEDIA_TYPE = 415
+DECODING_ERROR_WORDS = ('pars', 'decod', 'compress', 'encoding')  # ie: FastAPI's 'There was an error parsing the body'
+SEND = 'send'
+WAIT = 'wait'
+NETWORK_ERRORS = (requests.RequestException, httpx.HTTPError) if httpx is not None else (requests.RequestException,)
+
+
+def get_content_encoding(compression, accepted_encodings):
+    """The encoding to send bodies with, among the ones the backend accepts, None for plain bodies."""
+    if compression == 'zstd' and zstandard is not None and 'zstd' in accepted_encodings:
+        return 'zstd'
+    if compression in ('gzip', 'zstd') and 'gzip' in accepted_encodings:
+        return 'gzip'
+    return None
+
+
+def compress(body: bytes, content_encoding):
+    if content_encoding == 'zstd':
+        return zstandard.ZstdCompressor().compress(body)
+    if content_encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def get_accepted_encodings(response):
+    """Encodings the backend advertises in the accept-encoding header of its responses, None when it doesn't say."""
+    header = response.headers.get('accept-encoding')
+    if header is None:
+        return None
+    return frozenset(encoding.split(';')[0].strip().lower() for encoding in header.split(','))
+
+
+def is_encoding_refused(response):
+    """The backend couldn't read a compressed body: a 415, or a 400 saying the body couldn't be decoded."""
+    if response.status_code == UNSUPPORTED_MEDIA_TYPE:
+        return True
+    if response.status_code != BAD_REQUEST:
+        return False
+    try:
+        text = response.text.lower()
+    except (AttributeError, ValueError):
+        return False
+    return any(word in text for word in DECODING_ERROR_WORDS)
+
+
+def get_retry_wait(attempt, backoff=BACKEND_RETRY_BACKOFF):
+    """Exponential backoff with full jitter, so workers retrying at once don't hit the backend together."""
+    return random.uniform(0, backoff * 2 ** attempt)
+
+
+class BackendClient:
+    """
+    HTTP client of the fix backend. Keeps a pool of keep-alive connections, compresses bodies once the backend
+    advertises the encoding, and bounds every request with connect and read timeouts, plus retries with jitter within a
+    total deadline.
+    """
+
+    def __init__(self, base_url=BACKEND_DOMAIN, compression=BACKEND_COMPRESSION, pool_size=BACKEND_POOL_SIZE,
+                 connect_timeout=BACKEND_CONNECT_TIMEOUT, read_timeout=BACKEND_READ_TIMEOUT, deadline=BACKEND_DEADLINE,
+                 max_retries=BACKEND_MAX_RETRIES):
+        self.base_url = base_url
+        self.compression = compression
+        self.accepted_encodings = frozenset()  # plain bodies until the backend says what it takes.
+        self.timeout = (connect_timeout, read_timeout)
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.lock = threading.Lock()
+
+    def get_content_encoding(self, body):
+        if len(body) < MIN_COMPRESSION_SIZE:
+            return None
+        return get_content_encoding(self.compression, self.accepted_encodings)
+
+    def update_encodings(self, response, content_encoding):
+        """Returns True when the compressed body was refused, so it has to be sent again plain."""
+        with self.lock:
+            if content_encoding is not None and is_encoding_refused(response):
+                self.compression = None  # the backend doesn't take compressed bodies after all, sends them plain.
+                return True
+            accepted_encodings = get_accepted_encodings(response)
+            if accepted_encodings is not None:
+                self.accepted_encodings = accepted_encodings
+            return False
+
+    def get_exchanges(self, data: str, headers=None):
+        """
+        The request loop without its IO, shared by the sync and async clients: compression, retries and the deadline.
+        Yields (SEND, body, headers) and gets back the response or the connection error, yields (WAIT, seconds, None)
+        between attempts, and returns the response. Read timeouts aren't retried, the backend may still be computing
+        the fix, and all the attempts share an idempotency key so the backend can tell repeats apart.
+        """
+        body = data.encode('utf-8')
+        idempotency_key = uuid.uuid4().hex
+        metrics.increment('payload_bytes', len(body))
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            content_encoding = self.get_content_encoding(body)
+            compressed_body = compress(body, content_encoding)
+            metrics.increment('payload_bytes_sent', len(compressed_body))
+            request_headers = {'content-type': 'application/json', 'idempotency-key': idempotency_key,
+                               **(headers or {})}
+            if content_encoding is not None:
+                request_headers['content-encoding'] = content_encoding
+
+            response = yield SEND, compressed_body, request_headers
+            is_last_attempt = attempt >= self.max_retries or time.monotonic() >= deadline
+            if isinstance(response, Exception):
+                if is_last_attempt:
+                    raise response
+            else:
+                if self.update_encodings(response, content_encoding):
+                    continue
+                if response.status_code not in RETRY_STATUS_CODES or is_last_attempt:
+                    return response
+
+            yield WAIT, max(0, min(get_retry_wait(attempt), deadline - time.monotonic())), None
+            attempt += 1
+            metrics.increment('backend_retries')
+
+    def post(self, path, data: str, headers=None):
+        with metrics.span('backend_request'):
+            return self._post(path, data, headers)
+
+    def _post(self, path, data: str, headers=None):
+        exchanges = self.get_exchanges(data, headers)
+        result = None
+        while True:
+            try:
+                step, value, request_headers = exchanges.send(result)
+            except StopIteration as stop:
+                return stop.value
+
+            result = None
+            if step == WAIT:
+                time.sleep(value)
+                continue
+            try:
+                result = self.session.post(f'{self.base_url}{path}', data=value, headers=request_headers,
+                                           timeout=self.timeout)
+            except requests.ConnectionError as error:  # with connect timeouts, read timeouts aren't retried.
+                result = error
+
+
+backend_client = BackendClient()
+
+
+class AsyncBackendClient:
+    """
+    Async version of the backend client, for event loops. Uses httpx when installed, otherwise sends the requests with
+    the sync client on the loop's executor, so the loop is never blocked. Either way all the in-flight requests share
+    one connection pool, and the request loop and the compression state of the sync client.
+    """
+
+    def __init__(self, sync_client=backend_client, max_connections=BACKEND_POOL_SIZE):
+        self.sync_client = sync_client
+        self.max_connections = max_connections
+        self.client = None
+        self.client_loop = None
+
+    def get_client(self):
+        """httpx clients belong to the loop they are created on."""
+        loop = asyncio.get_running_loop()
+        if self.client is None or self.client_loop is not loop:
+            connect_timeout, read_timeout = self.sync_client.timeout
+            self.client = httpx.AsyncClient(
+                base_url=self.sync_client.base_url,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+            self.client_loop = loop
+        return self.client
+
+    async def post(self, path, data: str, headers=None):
+        with metrics.span('backend_request'):
+            return await self._post(path, data, headers)
+
+    async def _post(self, path, data: str, headers=None):
+        if httpx is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, functools.partial(self.sync_client._post, path, data, headers))
+
+        client = self.get_client()
+        exchanges = self.sync_client.get_exchanges(data, headers)
+        result = None
+        while True:
+            try:
+                step, value, request_headers = exchanges.send(result)
+            except StopIteration as stop:
+                return stop.value
+
+            result = None
+            if step == WAIT:
+                await asyncio.sleep(value)
+                continue
+            try:
+                result = await client.post(path, content=value, headers=request_headers)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as error:
+                result = error
+
+
+async_backend_client = AsyncBackendClient()
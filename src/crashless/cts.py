@@ -1,7 +1,8 @@
 import os
 
 DEBUG = bool(int(os.environ.get("CRASHLESS_DEBUG", 0)))
-BACKEND_DOMAIN = 'http://localhost:8000' if DEBUG else 'https://api.peaku.io'
+DEFAULT_BACKEND_DOMAIN = 'http://localhost:8000' if DEBUG else 'https://api.peaku.io'
+BACKEND_DOMAIN = os.environ.get("CRASHLESS_BACKEND_DOMAIN", DEFAULT_BACKEND_DOMAIN)
 
 AVG_CHARS_PER_WORD = 5 + 1  # this includes 1 space per word.
 SAFETY_FACTOR = 1.35
@@ -11,3 +12,76 @@ MAX_TOKENS = 128_000
 MAX_WORDS = int(MAX_TOKENS * AVG_WORDS_PER_TOKEN)
 MAX_WORDS_WITH_BOUND = int(MAX_WORDS / SAFETY_FACTOR)
 MAX_CHAR_WITH_BOUND = MAX_WORDS_WITH_BOUND * AVG_CHARS_PER_WORD
+
+# Fix cache: repeated crashes on the same code reuse the backend answer.
+FIX_CACHE_SIZE = int(os.environ.get("CRASHLESS_FIX_CACHE_SIZE", 256))
+FIX_CACHE_TTL = float(os.environ.get("CRASHLESS_FIX_CACHE_TTL", 24 * 60 * 60))  # in seconds
+FIX_CACHE_DIR = os.environ.get("CRASHLESS_FIX_CACHE_DIR")  # when set, fixes are also stored on disk.
+
+# Analysis pool: crashes are analyzed by a fixed number of workers, extra crashes wait on a bounded queue.
+ANALYSIS_WORKERS = int(os.environ.get("CRASHLESS_ANALYSIS_WORKERS", 1))  # 1 keeps terminal prompts in order.
+ANALYSIS_QUEUE_SIZE = int(os.environ.get("CRASHLESS_ANALYSIS_QUEUE_SIZE", 100))
+ANALYSIS_OVERFLOW_POLICY = os.environ.get("CRASHLESS_ANALYSIS_OVERFLOW_POLICY", 'coalesce')
+ASYNC_ANALYSIS_WORKERS = int(os.environ.get("CRASHLESS_ASYNC_ANALYSIS_WORKERS", 4))  # concurrent analyses on a loop.
+ANALYSIS_DELAY = 0.05  # in seconds, lets the server print the stacktrace before crashless prints anything.
+
+# Source cache: files are read, tokenized and parsed once per edit, instead of once per frame.
+SOURCE_CACHE_MAX_CHARS = int(os.environ.get("CRASHLESS_SOURCE_CACHE_MAX_CHARS", 20_000_000))
+
+# Symbol index: import tables are built once per module, files are checked for changes at most once per interval.
+SYMBOL_INDEX_CHECK_INTERVAL = float(os.environ.get("CRASHLESS_SYMBOL_INDEX_CHECK_INTERVAL", 1))  # in seconds
+CALL_GRAPH_MAX_DISTANCE = int(os.environ.get("CRASHLESS_CALL_GRAPH_MAX_DISTANCE", 4))  # calls followed from a frame.
+
+# Packages: when set, only sends the installed packages owning code in the stacktrace or the definitions.
+RELEVANT_PACKAGES_ONLY = bool(int(os.environ.get("CRASHLESS_RELEVANT_PACKAGES_ONLY", 0)))
+
+# Backend client: connections are reused, bodies compressed and requests have deadlines.
+BACKEND_POOL_SIZE = int(os.environ.get("CRASHLESS_BACKEND_POOL_SIZE", 4))
+BACKEND_COMPRESSION = os.environ.get("CRASHLESS_BACKEND_COMPRESSION", 'gzip')  # gzip, zstd or none, when advertised.
+BACKEND_CONNECT_TIMEOUT = float(os.environ.get("CRASHLESS_BACKEND_CONNECT_TIMEOUT", 5))  # in seconds
+BACKEND_READ_TIMEOUT = float(os.environ.get("CRASHLESS_BACKEND_READ_TIMEOUT", 120))  # in seconds
+BACKEND_DEADLINE = float(os.environ.get("CRASHLESS_BACKEND_DEADLINE", 300))  # in seconds, including retries.
+BACKEND_MAX_RETRIES = int(os.environ.get("CRASHLESS_BACKEND_MAX_RETRIES", 2))
+BACKEND_RETRY_BACKOFF = 0.5  # in seconds, doubles on every retry.
+
+# Content addressed payloads: code is sent by hash, and only the code the backend doesn't have yet is sent in full.
+CONTENT_ADDRESSED = bool(int(os.environ.get("CRASHLESS_CONTENT_ADDRESSED", 0)))
+
+# Local variables: their text is bounded, so huge or lazy objects can't blow up the crash handler.
+LOCAL_VAR_MAX_CHARS = int(os.environ.get("CRASHLESS_LOCAL_VAR_MAX_CHARS", 2_000))
+LOCAL_VARS_MAX_CHARS = int(os.environ.get("CRASHLESS_LOCAL_VARS_MAX_CHARS", 20_000))
+LOCAL_VARS_MAX_SECONDS = float(os.environ.get("CRASHLESS_LOCAL_VARS_MAX_SECONDS", 0.5))
+SNAPSHOT_LOCALS_MAX_CHARS = int(os.environ.get("CRASHLESS_SNAPSHOT_LOCALS_MAX_CHARS", 100_000))  # all frames together.
+SNAPSHOT_LOCALS_MAX_SECONDS = float(os.environ.get("CRASHLESS_SNAPSHOT_LOCALS_MAX_SECONDS", 1))  # all frames together.
+
+# Metrics: stage timings and counters are kept in memory, and dumped as json to this file on exit when it's set.
+METRICS_FILE = os.environ.get("CRASHLESS_METRICS_FILE")
+
+# Spool: in spool mode crashes are only written to disk, and `crashless replay` asks the backend for their fixes later.
+MODE = os.environ.get("CRASHLESS_MODE", 'interactive')  # interactive or spool
+SPOOL_DIR = os.environ.get("CRASHLESS_SPOOL_DIR", os.path.join(os.path.expanduser('~'), '.crashless', 'spool'))
+SPOOL_SEGMENT_MAX_BYTES = int(os.environ.get("CRASHLESS_SPOOL_SEGMENT_MAX_BYTES", 4_000_000))
+SPOOL_MAX_BYTES = int(os.environ.get("CRASHLESS_SPOOL_MAX_BYTES", 100_000_000))  # the oldest segments are deleted.
+SPOOL_BATCH_SIZE = int(os.environ.get("CRASHLESS_SPOOL_BATCH_SIZE", 20))  # crashes sent concurrently on replay.
+SPOOL_MAX_ATTEMPTS = 3  # a crash whose fix failed this many times isn't replayed again.
+
+# Rate limiting: the same crash is analyzed at most at this rate, then only a sample of it, so a hot failing endpoint
+# costs almost nothing beyond its response.
+CRASH_RATE_PER_MINUTE = float(os.environ.get("CRASHLESS_CRASH_RATE_PER_MINUTE", 2))  # of each crash
+CRASH_BURST = int(os.environ.get("CRASHLESS_CRASH_BURST", 3))
+GLOBAL_CRASH_RATE_PER_MINUTE = float(os.environ.get("CRASHLESS_GLOBAL_CRASH_RATE_PER_MINUTE", 30))  # of all crashes
+GLOBAL_CRASH_BURST = int(os.environ.get("CRASHLESS_GLOBAL_CRASH_BURST", 10))
+CRASH_SAMPLE_THRESHOLD = int(os.environ.get("CRASHLESS_CRASH_SAMPLE_THRESHOLD", 100))  # occurrences before sampling
+CRASH_SAMPLE_RATE = float(os.environ.get("CRASHLESS_CRASH_SAMPLE_RATE", 0.01))
+RATE_LIMIT_MAX_CRASHES = 10_000  # distinct crashes tracked, the least recently seen are forgotten.
+
+# Imports: the analysis is imported on the first crash, or right away in the background when prewarm is set.
+PREWARM = bool(int(os.environ.get("CRASHLESS_PREWARM", 0)))
+
+# Shared store: when set, all the processes of a deployment share this SQLite file, so each crash is analyzed by one
+# of them and their fixes are cached for all.
+STORE_PATH = os.environ.get("CRASHLESS_STORE_PATH")
+STORE_MAX_FIXES = int(os.environ.get("CRASHLESS_STORE_MAX_FIXES", 1_000))
+STORE_CLAIM_TTL = float(os.environ.get("CRASHLESS_STORE_CLAIM_TTL", 10 * 60))  # in seconds, longest analysis.
+STORE_DEDUPE_TTL = float(os.environ.get("CRASHLESS_STORE_DEDUPE_TTL", 60 * 60))  # in seconds, skipped after analyzed.
+STORE_RETRY_INTERVAL = 60  # in seconds, between attempts to open a store that couldn't be opened.
@@ -1,11 +1,11 @@
-from threading import Timer
-
 from django.http import JsonResponse
 
-from crashless import handler
+from crashless import capture
+from crashless.ratelimit import crash_limiter, get_crash_key
 
 
 def handle_exception(exc: Exception):
-    """Makes sure that messages display in the correct order in the terminal"""
-    Timer(interval=0.05, function=handler.threaded_function, args=(exc,)).start()
-    return JsonResponse(status_code=500, data=handler.get_content_message(exc))
+    """Queues the crash for analysis on the shared pool and responds right away"""
+    if crash_limiter.allow(get_crash_key(exc)):  # a repeated crash is dropped before walking its frames.
+        capture.submit_exception(exc)
+    return JsonResponse(status_code=500, data=capture.get_content_message(exc))
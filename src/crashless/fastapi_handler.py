@@ -1,12 +1,12 @@
-from threading import Timer
-
 from starlette.requests import Request
 from fastapi.responses import JSONResponse
 
-from crashless import handler
+from crashless import capture
+from crashless.ratelimit import crash_limiter, get_crash_key
 
 
-def handle_exception(request: Request, exc: Exception):
-    """Makes sure that messages display in the correct order in the terminal"""
-    Timer(interval=0.05, function=handler.threaded_function, args=(exc,)).start()
-    return JSONResponse(status_code=500, content=handler.get_content_message(exc))
+async def handle_exception(request: Request, exc: Exception):
+    """Queues the crash for analysis on the event loop and responds right away, the analysis never blocks the loop"""
+    if crash_limiter.allow(get_crash_key(exc)):  # a repeated crash is dropped before walking its frames.
+        capture.submit_exception_async(exc)
+    return JSONResponse(status_code=500, content=capture.get_content_message(exc))
@@ -1,32 +1,38 @@
-import os
 import re
-import ast
-import sys
-import types
+import json
+import time
+import sqlite3
+import asyncio
 import inspect
-import tokenize
-import tempfile
-import traceback
-import subprocess
-from io import BytesIO
-from types import ModuleType
+import weakref
+import threading
 from typing import List, Dict, Optional
-from collections import defaultdict
-from pip._internal.operations import freeze
+from collections import deque
 
-import requests
 from halo import Halo
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
+
+from crashless import blobs
+from crashless.cts import DEBUG, RELEVANT_PACKAGES_ONLY, CONTENT_ADDRESSED, MODE, CALL_GRAPH_MAX_DISTANCE
+from crashless.client import backend_client, async_backend_client, NETWORK_ERRORS
+from crashless.packages import package_inventory
+from crashless.packer import pack
+from crashless.metrics import metrics
+from crashless.patches import get_hunks, get_patch, get_git_path, apply_patches, PatchError
+from crashless.sources import get_source_file
+from crashless.symbols import symbol_index
+from crashless.classes import get_class_members, get_qualified_name
+from crashless.cache import get_fix_cache, get_fix_fingerprint
+from crashless.snapshot import CrashSnapshot
+from crashless.spool import get_spool, SPOOL_MODE
+from crashless.store import get_store
 
-from crashless.cts import DEBUG, MAX_CHAR_WITH_BOUND, BACKEND_DOMAIN
-
-GIT_HEADER_REGEX = r'@@.*@@.*\n'
 MAX_CONTEXT_MARGIN = 100
+CODE_FIX_PATH = '/crashless/get-crash-fix'
+CODE_FIX_HEADERS = {'accept': 'application/json', 'accept-language': 'en'}
+functions_cache = weakref.WeakKeyDictionary()  # function -> (source file, definition, called names)
 OPTIONAL_COMMENT = r'\s*(?:#.*)?'
-FUNCTION_NAME = '\w+(?:\.\w+)*'
-FUNCTION_CALL = rf'{FUNCTION_NAME}\s*\('
-FUNCTION_CALL_WRAPPER = r'^[^#]*{function_name}\s*\(.*$'
-FUNCTION_CALLING_LINE = FUNCTION_CALL_WRAPPER.format(function_name=FUNCTION_NAME)
+UNCLAIMED = ''  # owner of crashes analyzed without a shared store.
 
 
 class Code(BaseModel):
@@ -35,6 +41,7 @@ class Code(BaseModel):
     code: str
     start_scope_index: int
     end_scope_index: int
+    _distance: int = PrivateAttr(default=0)  # steps on the call graph from the crashing line, not sent.
 
 
 class Environment(Code):
@@ -56,25 +63,6 @@ class Payload(BaseModel):
     additional_definitions: Dict[str, Definition]
 
 
-def get_function_call_matches(line, single_regex, double_regex):
-
-    # This is an approximation, it's too uncommon to have a def where a param cals a function...
-    if re.match('(\b|\s)*def\s+', line):
-        return []
-
-    matches = re.findall(single_regex, line) + re.findall(double_regex, line)
-    if not matches:
-        return []
-
-    # Check it's not inside a string, if there's an odd number of string symbols, so the string is 'open'
-    first_split = re.split(FUNCTION_CALL, line)[0]
-    is_in_string = first_split.count("'") % 2 or first_split.count('"') % 2
-    if is_in_string:
-        return []
-
-    return matches
-
-
 class CodeFix(BaseModel):
     index: Optional[int] = None
     file_path: str = None
@@ -83,18 +71,23 @@ class CodeFix(BaseModel):
     error: str = None
 
 
-def get_code_fix(payload: Payload):
-    request_params = {
-        'url': f'{BACKEND_DOMAIN}/crashless/get-crash-fix',
-        'data': payload.json(),
-        'headers': {'accept': 'application/json', 'accept-language': 'en'}
-    }
-    if DEBUG:
-        response = requests.post(**request_params)
-    else:
-        with Halo(text=get_str_with_color(f'Thinking possible solution', BColors.WARNING), spinner='dots'):
-            response = requests.post(**request_params)
+def post_code_fix_request(payload: Payload):
+    if CONTENT_ADDRESSED and blobs.is_supported():
+        response = blobs.send_payload(backend_client, payload.dict(), headers=CODE_FIX_HEADERS)
+        if response is not None:
+            return response
+    return backend_client.post(CODE_FIX_PATH, payload.json(), headers=CODE_FIX_HEADERS)
+
+
+async def post_code_fix_request_async(payload: Payload):
+    if CONTENT_ADDRESSED and blobs.is_supported():
+        response = await blobs.send_payload_async(async_backend_client, payload.dict(), headers=CODE_FIX_HEADERS)
+        if response is not None:
+            return response
+    return await async_backend_client.post(CODE_FIX_PATH, payload.json(), headers=CODE_FIX_HEADERS)
 
+
+def get_code_fix_from_response(response):
     if response.status_code != 200:
         return CodeFix(error=f'Failed request with {response.status_code=} and detail={response.json().get("detail")}')
 
@@ -102,74 +95,68 @@ def get_code_fix(payload: Payload):
     return CodeFix(**json_response)
 
 
-class BColors:
-    HEADER = '\033[95m'
-    OKBLUE = '\033[94m'
-    OKCYAN = '\033[96m'
-    OKGREEN = '\033[92m'
-    WARNING = '\033[93m'
-    FAIL = '\033[91m'
-    ENDC = '\033[0m'
-    BOLD = '\033[1m'
-    UNDERLINE = '\033[4m'
-
+def get_code_fix(payload: Payload, show_spinner=True):
+    try:
+        if DEBUG or not show_spinner:
+            response = post_code_fix_request(payload)
+        else:
+            with Halo(text=get_str_with_color(f'Thinking possible solution', BColors.WARNING), spinner='dots'):
+                response = post_code_fix_request(payload)
+    except NETWORK_ERRORS as error:
+        return CodeFix(error=f'Failed request with {error=}')
 
-def get_git_root():
-    result = subprocess.run(["git", "rev-parse", '--show-toplevel'], capture_output=True, text=True)
-    if result.returncode != 0:
-        print_error(result)
+    return get_code_fix_from_response(response)
 
-    return result.stdout.strip()
 
+async def get_code_fix_async(payload: Payload):
+    try:
+        if DEBUG:
+            response = await post_code_fix_request_async(payload)
+        else:
+            with Halo(text=get_str_with_color(f'Thinking possible solution', BColors.WARNING), spinner='dots'):
+                response = await post_code_fix_request_async(payload)
+    except NETWORK_ERRORS as error:
+        return CodeFix(error=f'Failed request with {error=}')
 
-def get_git_path(absolute_path):
-    root_of_git = get_git_root()
-    if root_of_git:  # There's a git repo on the path.
-        # Removes the absolute path part, and uses relatives paths to that .git file.
-        return absolute_path.replace(root_of_git, '')
-    else:
-        # There's no .git on the path, will use absolute paths.
-        return f'/{absolute_path}'  # Needs to add a / to read the absolute path
+    return get_code_fix_from_response(response)
 
 
-def get_diffs_and_patch(old_code, new_code, file_path, temp_patch_file):
-    with tempfile.NamedTemporaryFile(mode='w') as temp_old_file, tempfile.NamedTemporaryFile(mode='w') as temp_new_file:
-        try:
-            temp_old_file.write(old_code)
-            temp_new_file.write(new_code)
-        except UnicodeEncodeError:
-            return None
+def get_code_fix_from_cache(fix_fingerprint):
+    cached_fix = get_fix_cache().get(fix_fingerprint)
+    return CodeFix(**cached_fix) if cached_fix is not None else None
 
-        temp_old_file.flush()  # makes sure that contents are written to file
-        temp_new_file.flush()
 
-        # Run "git diff" comparing temporary files.
-        result_diff = subprocess.run(["git", "diff", '--no-index', temp_old_file.name, temp_new_file.name],
-                                capture_output=True, text=True)
-        # Codes for actual errors are >= 2, while 0 and 1 are success with no diff and diff respectively.
-        if result_diff.returncode >= 2:
-            print_error(result_diff)
+def cache_code_fix(fix_fingerprint, code_fix: CodeFix):
+    if code_fix.error is None:  # errors can be transient, so they are never cached.
+        get_fix_cache().set(fix_fingerprint, code_fix.dict())
 
-        patch_content = result_diff.stdout
-        git_path = get_git_path(file_path)
-        patch_content = patch_content.replace(temp_old_file.name, git_path).replace(temp_new_file.name, git_path)
 
-        # Move the pointer to the beginning
-        temp_patch_file.seek(0)
+def get_cached_code_fix(payload: Payload, fix_fingerprint, show_spinner=True):
+    """The same crash on the same code gets the same answer, so it's only asked once to the backend."""
+    code_fix = get_code_fix_from_cache(fix_fingerprint)
+    if code_fix is None:
+        code_fix = get_code_fix(payload, show_spinner)
+        cache_code_fix(fix_fingerprint, code_fix)
+    return code_fix
 
-        # Write the modified content
-        temp_patch_file.write(patch_content)
 
-        # Truncate the remaining part of the file
-        temp_patch_file.truncate()
+class BColors:
+    HEADER = '\033[95m'
+    OKBLUE = '\033[94m'
+    OKCYAN = '\033[96m'
+    OKGREEN = '\033[92m'
+    WARNING = '\033[93m'
+    FAIL = '\033[91m'
+    ENDC = '\033[0m'
+    BOLD = '\033[1m'
+    UNDERLINE = '\033[4m'
 
-        # Removes header with the context to get only the code resulting from the "git diff".
-        diff_content = re.split(GIT_HEADER_REGEX, patch_content)
 
-    try:
-        return diff_content[1:]  # returns a list of changes in different parts.
-    except IndexError:
-        return []
+def get_diffs_and_patch(old_code, new_code, file_path):
+    with metrics.span('diff_patch'):
+        hunks = get_hunks(old_code, new_code)
+        patch_content = get_patch(get_git_path(file_path), hunks)
+    return [body for _, body in hunks], patch_content  # a list of changes in different parts, and the whole patch.
 
 
 def get_str_with_color(line, color):
@@ -180,11 +167,6 @@ def print_with_color(line, color):
     print(get_str_with_color(line, color))
 
 
-def print_error(result):
-    error_message = result.stderr.strip() or "Unknown error occurred"
-    print_with_color(error_message, BColors.FAIL)
-
-
 def print_diff(content):
     if content is None:
         return
@@ -203,76 +185,36 @@ def add_newline_every_n_chars(input_string, n_words=20):
     return '\n'.join(' '.join(words[i:i + n_words]) for i in range(0, len(words), n_words))
 
 
-def ask_to_fix_code(solution, temp_patch_file):
+def ask_to_fix_code(solution):
     print_with_color(f'AI got an answer, the following code changes will be applied:', BColors.WARNING)
     print(f'In {solution.file_path}:')
     for diff in solution.diffs:
         print_diff(diff)
 
     print_with_color(f'Explanation: {add_newline_every_n_chars(solution.explanation)}', BColors.OKBLUE)
-    user_input = input('Apply changes(Y/n)?: ')
+    try:
+        user_input = input('Apply changes(Y/n)?: ')
+    except EOFError:  # no terminal to ask, as in servers with a closed stdin, changes are never applied unasked.
+        user_input = 'n'
     apply_changes = user_input in ('Y', '')
     if apply_changes:
         print_with_color('Please wait while changes are deployed...', BColors.WARNING)
         print_with_color("On PyCharm reload file with: Ctrl+Alt+Y, on mac: option+command+Y", BColors.WARNING)
 
-        # Uses unsafe-paths option to be able to modify when provided absolute paths.
-        result = subprocess.run(["git", "apply", temp_patch_file.name, '--unsafe-paths'],
-                                capture_output=True, text=True)
-
-        if result.returncode == 0:
+        try:
+            apply_patches([solution.patch])
             print_with_color("Changes have been deployed :)", BColors.OKGREEN)
-        else:
-            print_error(result)
+        except PatchError as error:
+            print_with_color(str(error), BColors.FAIL)
     else:
         print_with_color('Code still has this pesky bug :(', BColors.WARNING)
 
     return solution
 
 
-def get_code_lines(code):
-    lines_dict = dict()
-    tokens = list(tokenize.tokenize(BytesIO(code.encode('utf-8')).readline))
-    for token in tokens:
-        start_position = token.start
-        end_position = token.end
-        start_line = start_position[0]
-        end_line = end_position[0]
-
-        if lines_dict.get(start_line) is None and start_line > 0:
-            lines_dict[start_line] = token.line
-
-        if start_line < end_line:  # multiline token, will add missing lines
-            for idx, line in enumerate(token.line.split('\n')):
-                lines_dict[start_line + idx] = f'{line}\n'
-
-    return list(lines_dict.values())
-
-
-class ScopeAnalyzer(ast.NodeVisitor):
-    def __init__(self):
-        self.scopes = []
-        self.line_scopes = defaultdict(list)  # dict()
-
-    def visit_FunctionDef(self, node):
-        self.scopes.append(f"Function: {node.name}_{node.__hash__()}")
-        self.generic_visit(node)
-        self.scopes.pop()
-
-    def visit_ClassDef(self, node):
-        self.scopes.append(f"Class: {node.name}_{node.__hash__()}")
-        self.generic_visit(node)
-        self.scopes.pop()
-
-    def visit(self, node):
-        if hasattr(node, 'lineno') and not self.line_scopes[node.lineno]:
-            self.line_scopes[node.lineno].extend(self.scopes)
-        super().visit(node)
-
-
 def get_end_scope_index(scope_error, analyzer, error_line_number):
     """Outputs, zero based indexing"""
-    end_index = max([line for line, scope in analyzer.line_scopes.items() if scope == scope_error])
+    _, end_index = analyzer.get_scope_bounds(scope_error)
     end_index = min(error_line_number + MAX_CONTEXT_MARGIN, end_index)  # hard limit on data amount
     end_index -= 1  # change from 1 based indexing to 0 based indexing
 
@@ -298,7 +240,7 @@ def missing_definition(first_index, lines):
 
 def get_start_scope_index(scope_error, analyzer, error_line_number, file_length, file_lines):
     """Outputs, zero based indexing"""
-    first_index = min([line for line, scope in analyzer.line_scopes.items() if scope == scope_error])
+    first_index, _ = analyzer.get_scope_bounds(scope_error)
     first_index -= 1  # change from 1 based indexing to 0 based indexing
 
     first_index = max(error_line_number - MAX_CONTEXT_MARGIN, first_index)  # hard limit on data amount
@@ -311,14 +253,11 @@ def get_start_scope_index(scope_error, analyzer, error_line_number, file_length,
     return first_index
 
 
-def get_context_code_lines(error_line_number, file_lines, code):
+def get_context_code_lines(error_line_number, source_file):
     """Uses the scope to know what should be included"""
-
-    tree = ast.parse(code)
-    analyzer = ScopeAnalyzer()
-    analyzer.visit(tree)
-
-    scope_error = analyzer.line_scopes[error_line_number]
+    file_lines = source_file.lines
+    analyzer = source_file.analyzer
+    scope_error = analyzer.get_scope_id(error_line_number)
     start_index = get_start_scope_index(scope_error=scope_error,
                                         analyzer=analyzer,
                                         error_line_number=error_line_number,
@@ -332,208 +271,133 @@ def get_context_code_lines(error_line_number, file_lines, code):
     return file_lines[start_index: including_last_line_index], start_index, end_index
 
 
-def is_user_module(module):
-    """User defined no builtin or third party module"""
-    if module is None:
-        return False
-    if not hasattr(module, '__file__') or module.__file__ is None:
-        return False
-
-    return path_is_in_user_code(module.__file__) and module.__name__ != '__builtins__'
-
-
-def get_imported_modules(module: ModuleType):
-    return [obj for name, obj in module.__dict__.items() if isinstance(obj, ModuleType) and is_user_module(obj)]
-
-
-def get_functions_from_module(module):
-    """Filter functions defined in this module"""
-    function_tuples = inspect.getmembers(module, lambda obj: isinstance(obj, types.FunctionType))
-    return {name: func for name, func in function_tuples if path_is_in_user_code(inspect.getfile(func))}
-
-
-def get_functions_from_module_recursively(module, scrapped_module_names=[], base_module=False):
-    """This recursion is efficient by storing what's already scrapped and not repeating."""
-    # TODO: what happens with direct imports, ie from module_x import my_function
-
-    # my local functions
-    module_dict = get_functions_from_module(module)
-    if not base_module:  # Prepends name, to be able to use later on regex, and don't mix workspaces.
-        module_dict = {**module_dict, **{f'{module.__name__}.{name}': func for name, func in module_dict.items()}}
+def get_definition(name, obj):
+    source_lines, start_line = inspect.getsourcelines(obj)
+    start_line -= 1  # zero based indexing
+    end_line = start_line + len(source_lines) - 1
+    source_code = ''.join(source_lines)  # \n already in the lines
 
-    # Stores what's scrapped already so it won't repeat
-    scrapped_module_names.append(module.__name__)
+    if source_code[-1] == '\n':  # prevent a last \n from introducing a fake extra line.
+        source_code = source_code[:-1]
 
-    imported_modules = get_imported_modules(module)
-    imported_modules = [imported_module for imported_module in imported_modules
-                        if imported_module.__name__ not in scrapped_module_names]
-    for imported_module in imported_modules:
-        # Prepends name, to abel to use later on regex, and don't mix workspaces.
-        imported_module_dict, scrapped_module_names = get_functions_from_module_recursively(imported_module,
-                                                                                            scrapped_module_names)
-        module_dict = {**module_dict, **imported_module_dict}
+    return Definition(
+        name=name,
+        code=source_code,
+        file_path=inspect.getfile(obj),
+        start_scope_index=start_line,
+        end_scope_index=end_line,
+    )
 
-    return module_dict, scrapped_module_names
 
+def get_function_definition_and_called_names(name, func):
+    """A function's file is read and scanned once, and again only when the file changes."""
+    definition = get_definition(name, func)
+    source_file = get_source_file(definition.file_path)
+    called_names = source_file.get_called_names(definition.start_scope_index + 1, definition.end_scope_index + 1)
+    return source_file, definition, called_names
 
-def get_user_defined_functions_from_frame(frame):
 
-    # Get the module associated with the input frame
-    module = inspect.getmodule(frame)
-    if not module:
-        return dict()
+def get_cached_function_definition_and_called_names(name, func):
+    cached = functions_cache.get(func)
+    if cached is None or cached[0] is not get_source_file(inspect.getfile(func)):
+        cached = get_function_definition_and_called_names(name, func)
+        functions_cache[func] = cached
 
-    module_dict, scrapped_module_names = get_functions_from_module_recursively(module, base_module=True)
-    return module_dict
+    _, definition, called_names = cached
+    return definition.copy(update={'name': name}), called_names  # copies as the index is set later on.
 
 
-def get_function_specific_regex(functions):
-    """Matching several options of users defined functions. Needs to escape the names because some have dots."""
-    # having parenthesis produces a capturing group.
-    escaped_function_names = f"({'|'.join([re.escape(name) for name in functions])})"
-    return FUNCTION_CALL_WRAPPER.format(function_name=escaped_function_names)
+def get_method_definitions_closure(module_name, called_names, max_distance=CALL_GRAPH_MAX_DISTANCE):
+    """
+    Breadth first walk on the call graph from the called names, up to max distance calls away. Each call is resolved
+    in the module it's made from, and each function is visited once, so recursive or diamond shaped calls don't
+    repeat work. Definitions are named by the qualified name of the function, at their smallest distance.
+    """
+    definitions = dict()
+    visited_functions = set()  # not their code, equal code objects of different modules compare equal.
+    worklist = deque((module_name, called_name, 1) for called_name in called_names)
+    while worklist:
+        module_name, called_name, distance = worklist.popleft()
+        func = symbol_index.resolve(module_name, called_name)
+        if func is None or func in visited_functions:
+            continue
+
+        visited_functions.add(func)
+        name = get_qualified_name(func)  # different functions can be called by the same name.
+        definition, callees = get_cached_function_definition_and_called_names(name, func)
+        definition._distance = distance
+        definitions[name] = definition
+        if distance < max_distance:
+            worklist.extend((func.__module__, callee, distance + 1) for callee in callees)
 
+    return definitions
 
-def get_function_regexes(function_dict):
-    single_functions = [name for name, _ in function_dict.items() if '.' not in name]
-    double_functions = [name for name, _ in function_dict.items() if '.' in name]
-    return get_function_specific_regex(single_functions), get_function_specific_regex(double_functions)
 
+def get_method_definitions(frame, source_file, start_scope_index, end_scope_index):
+    called_names = source_file.get_called_names(start_scope_index + 1, end_scope_index + 1)
+    with metrics.span('definition_closure'):
+        return get_method_definitions_closure(frame.module_name, called_names)
 
-def get_definition(name, obj):
-    source_lines, start_line = inspect.getsourcelines(obj)
-    start_line -= 1  # zero based indexing
-    end_line = start_line + len(source_lines) - 1
-    source_code = ''.join(source_lines)  # \n already in the lines
 
+def get_lines_definition(name, source_file, first_line, last_line):
+    """Definition of the lines between both, 1 based and inclusive."""
+    source_code = ''.join(source_file.lines[first_line - 1:last_line])
     if source_code[-1] == '\n':  # prevent a last \n from introducing a fake extra line.
         source_code = source_code[:-1]
 
     return Definition(
         name=name,
         code=source_code,
-        file_path=inspect.getfile(obj),
-        start_scope_index=start_line,
-        end_scope_index=end_line,
+        file_path=source_file.path,
+        start_scope_index=first_line - 1,
+        end_scope_index=last_line - 1,
     )
 
 
-def get_method_definitions_recursively(function_dict, code_lines, single_regex, double_regex,
-                                       method_name_called_from=None):
-    called_methods = dict()
-    for line in code_lines:
-        matched_functions = get_function_call_matches(line, single_regex, double_regex)
-        for matched_function in matched_functions:
-            try:  # Tries module import, ie module.function
-                called_methods[matched_function] = function_dict[matched_function]
-            except KeyError:
-                try:  # Tries function import
-                    called_methods[matched_function] = function_dict[matched_function.split('.')[-1]]
-                except KeyError:
-                    pass
-
-    # removes the method it's been called from, to prevent infinite recursion when there's a
-    # recursion on the user code.
-    called_methods.pop(method_name_called_from, None)
-
-    source_code_dict = dict()
-    for method_name, func in called_methods.items():
-        func_definition = get_definition(method_name, func)
-        source_code_dict[method_name] = func_definition
-        source_code_dict = {
-            **source_code_dict,
-            **get_method_definitions_recursively(function_dict, func_definition.code.split('\n'),
-                                                 single_regex=single_regex, double_regex=double_regex,
-                                                 method_name_called_from=method_name)
-        }
-
-    return source_code_dict
-
-
-def get_method_definitions(stacktrace, code_lines):
-    frame = stacktrace.tb_frame
-    function_dict = get_user_defined_functions_from_frame(frame)
-    single_regex, double_regex = get_function_regexes(function_dict)
-    return get_method_definitions_recursively(function_dict, code_lines, single_regex, double_regex)
-
-
-def get_length_of_dict(my_dict):
-    return len(str(my_dict))
-
-
-def cut_definitions(definitions):
-    shortened_definitions = dict()
-    for name, definition in definitions.items():
-        total_chars = get_length_of_dict(shortened_definitions)
-        if total_chars > MAX_CHAR_WITH_BOUND:
-            if DEBUG:
-                print(f'CHARS_LIMIT exceeded, {total_chars=} on definitions')
-            break
-        shortened_definitions[name] = definition
-
-    return shortened_definitions
-
-
-def get_instances_and_classes_definitions(local_vars):
-    # TODO: find definitions recursively
-    definitions = dict()
-    for var in local_vars.values():
-        try:
-            the_class = var if inspect.isclass(var) else var.__class__
-            if path_is_in_user_code(inspect.getfile(the_class)):
-                class_name = the_class.__name__
-                definitions[class_name] = get_definition(class_name, the_class)
-        except (TypeError, OSError):
-            pass
-
-    return definitions
-
+def get_used_names(source_file, start_scope_index, end_scope_index, methods_definitions):
+    """Attributes accessed from the crashing scope and from the functions it calls, ie: employee.get_name()"""
+    used_names = source_file.get_attribute_names(start_scope_index + 1, end_scope_index + 1)
+    for definition in methods_definitions.values():
+        definition_source_file = get_source_file(definition.file_path)
+        used_names += definition_source_file.get_attribute_names(definition.start_scope_index + 1,
+                                                                 definition.end_scope_index + 1)
+    return list(dict.fromkeys(used_names))
 
-def get_file_path(stacktrace):
-    frame = stacktrace.tb_frame
-    return frame.f_code.co_filename
 
+def get_instances_and_classes_definitions(local_classes, used_names):
+    """Header and fields of the classes, their bases and the classes of their fields, and only the methods used."""
+    definitions = dict()
+    with metrics.span('class_extraction'):
+        for name, source_file, first_line, last_line, distance in get_class_members(local_classes, used_names):
+            definition = get_lines_definition(name, source_file, first_line, last_line)
+            definition._distance = distance
+            definitions[name] = definition
 
-def get_local_vars(stacktrace):
-    frame = stacktrace.tb_frame
-    return frame.f_locals
+    return definitions
 
 
-def get_definitions(local_vars, stacktrace, code_lines):
-    objects_definitions = get_instances_and_classes_definitions(local_vars)
-    methods_definitions = get_method_definitions(stacktrace, code_lines)
+def get_definitions(frame, source_file, start_scope_index, end_scope_index):
+    methods_definitions = get_method_definitions(frame, source_file, start_scope_index, end_scope_index)
+    used_names = get_used_names(source_file, start_scope_index, end_scope_index, methods_definitions)
+    objects_definitions = get_instances_and_classes_definitions(frame.local_classes, used_names)
     additional_definitions = {**objects_definitions, **methods_definitions}
-    return cut_definitions(additional_definitions)
+    return additional_definitions
 
 
-def get_local_vars_str(local_vars):
-    """Calling local vars can randomly raise an error"""
-    var_dict = {}
-    for name in local_vars.keys():  # cannot call item here cause will explode if a local variable has an exception.
-        try:
-            # Can only call the value inside the try except.
-            var_dict[name] = str(local_vars[name])
-        except Exception:
-            pass
-    return str(var_dict)
-
-
-def get_environment_and_defs(stacktrace, idx):
-    file_path = get_file_path(stacktrace)
-    error_line_number = stacktrace.tb_lineno
-    with open(file_path, 'r') as file_code:
-        file_content = file_code.read()
-    file_lines = get_code_lines(file_content)
+def get_environment_and_defs(frame, idx):
+    file_path = frame.file_path
+    error_line_number = frame.line_number
+    source_file = get_source_file(file_path)
+    file_lines = source_file.lines
     total_file_lines = len(file_lines)
     error_code_line = file_lines[error_line_number - 1]  # zero based counting
-    code_lines, start_scope_index, end_scope_index = get_context_code_lines(error_line_number, file_lines, file_content)
+    code_lines, start_scope_index, end_scope_index = get_context_code_lines(error_line_number, source_file)
     code = ''.join(code_lines)
 
     if code[-1] == '\n':  # prevent a last \n from introducing a fake extra line.
         code = code[:-1]
 
-    local_vars = get_local_vars(stacktrace)
-    additional_definitions = get_definitions(local_vars, stacktrace, code_lines)
+    additional_definitions = get_definitions(frame, source_file, start_scope_index, end_scope_index)
 
     environment = Environment(
         index=idx,
@@ -542,7 +406,7 @@ def get_environment_and_defs(stacktrace, idx):
         start_scope_index=start_scope_index,
         end_scope_index=end_scope_index,
         error_code_line=error_code_line,
-        local_vars=get_local_vars_str(local_vars),
+        local_vars=frame.local_vars_str,
         error_line_number=error_line_number,
         total_file_lines=total_file_lines,
         used_additional_definitions=list(additional_definitions.keys()),
@@ -550,36 +414,22 @@ def get_environment_and_defs(stacktrace, idx):
     return environment, additional_definitions
 
 
-def path_is_in_user_code(file_path):
-    not_in_packages = "site-packages" not in file_path and "lib/python" not in file_path
-    in_project_dir = os.getcwd() in file_path
-    return not_in_packages and in_project_dir
+def get_payload_codes(payload: Payload):
+    return [e.code for e in payload.environments] + [d.code for d in payload.additional_definitions.values()]
 
 
-def get_stacktrace(exc):
-    return "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
-
-
-def get_environments_and_defs(exc):
-    # Find lowest non-lib level
-    levels = []
-    stacktrace_level = exc.__traceback__
-    while True:
-        if stacktrace_level is None:
-            break
-
-        file_path = get_file_path(stacktrace_level)
-        if path_is_in_user_code(file_path):
-            levels.append(stacktrace_level)
-
-        stacktrace_level = stacktrace_level.tb_next  # Move to the next level in the stack trace
-
+def get_environments_and_defs(snapshot: CrashSnapshot):
+    frames = snapshot.user_frames
     environments = []
     all_definitions = dict()
-    for idx, level in enumerate(levels):
-        environment, definitions = get_environment_and_defs(level, idx)
+    for idx, frame in enumerate(frames):
+        environment, definitions = get_environment_and_defs(frame, idx)
+        environment._distance = len(frames) - 1 - idx  # the last frame is where it crashed.
         environments.append(environment)
-        all_definitions = {**all_definitions, **definitions}
+        for name, definition in definitions.items():
+            definition._distance += environment._distance
+            if name not in all_definitions or definition._distance <= all_definitions[name]._distance:
+                all_definitions[name] = definition
     return environments, all_definitions
 
 
@@ -591,25 +441,49 @@ def environment_or_definition(index, payload):
         return None
 
 
-def get_new_code_and_diffs(code_fix, payload, temp_patch_file):
+def get_current_scope_indexes(env_or_def, file_lines, file_path):
+    """
+    Where the code sent for the fix is now, the file may have changed since the crash, as with replayed crashes. It's
+    looked for elsewhere in the file when it moved, raises PatchError when it's not there or it's ambiguous.
+    """
+    code_lines = env_or_def.code.split('\n')
+    start_scope_index, end_scope_index = env_or_def.start_scope_index, env_or_def.end_scope_index
+    if file_lines[start_scope_index:end_scope_index + 1] == code_lines:
+        return start_scope_index, end_scope_index
+
+    starts = [idx for idx in range(len(file_lines) - len(code_lines) + 1)
+              if file_lines[idx:idx + len(code_lines)] == code_lines]
+    if len(starts) != 1:
+        raise PatchError(f'{file_path} changed since the crash, line {start_scope_index + 1} does not match the code '
+                         f'that was fixed')
+    return starts[0], starts[0] + len(code_lines) - 1
+
+
+def get_new_code_and_diffs(code_fix, payload):
     if code_fix.index is None:
-        return None, []
+        return None, [], None
 
     fixed_env_or_def = environment_or_definition(code_fix.index, payload)
-    with open(code_fix.file_path, "r") as file_code:
+    with open(code_fix.file_path, "r", newline='') as file_code:  # patches keep the line ends of the file.
         old_code = file_code.read()
-        file_lines = old_code.split('\n')
+    newline = '\r\n' if '\r\n' in old_code else '\n'
+    file_lines = old_code.split(newline)
 
-    lines_above = file_lines[:fixed_env_or_def.start_scope_index]
-    lines_below = file_lines[fixed_env_or_def.end_scope_index + 1:]  # cannot include end line.
+    start_scope_index, end_scope_index = get_current_scope_indexes(fixed_env_or_def, file_lines, code_fix.file_path)
+    lines_above = file_lines[:start_scope_index]
+    lines_below = file_lines[end_scope_index + 1:]  # cannot include end line.
     code_pieces = code_fix.fixed_code.split('\n')
-    new_code = '\n'.join(lines_above + code_pieces + lines_below)
-    diffs = get_diffs_and_patch(old_code, new_code, code_fix.file_path, temp_patch_file)
-    return new_code, diffs
+    new_code = newline.join(lines_above + code_pieces + lines_below)
+    diffs, patch = get_diffs_and_patch(old_code, new_code, code_fix.file_path)
+    return new_code, diffs, patch
+
+
+def get_solution(payload: Payload, fix_fingerprint):
+    code_fix = get_cached_code_fix(payload, fix_fingerprint)
+    return get_solution_from_code_fix(payload, code_fix)
 
 
-def get_solution(payload: Payload, temp_patch_file):
-    code_fix = get_code_fix(payload)
+def get_solution_from_code_fix(payload: Payload, code_fix: CodeFix):
     explanation = code_fix.explanation
 
     # there's nothing
@@ -631,9 +505,19 @@ def get_solution(payload: Payload, temp_patch_file):
             error=code_fix.error,
         )
 
-    new_code, diffs = get_new_code_and_diffs(code_fix, payload, temp_patch_file)
+    try:
+        new_code, diffs, patch = get_new_code_and_diffs(code_fix, payload)
+    except PatchError as error:  # the fix is still explained, but can't be applied on the current code.
+        return Solution(
+            not_found=False,
+            file_path=code_fix.file_path,
+            explanation=explanation,
+            stacktrace_str=payload.stacktrace_str,
+            error=str(error),
+        )
     return Solution(
         diffs=diffs,
+        patch=patch,
         new_code=new_code,
         file_path=code_fix.file_path,
         explanation=explanation,
@@ -645,6 +529,7 @@ def get_solution(payload: Payload, temp_patch_file):
 class Solution(BaseModel):
     not_found: bool = False
     diffs: List[str] = []
+    patch: str = None
     new_code: str = None
     file_path: str = None
     explanation: str = None
@@ -652,50 +537,153 @@ class Solution(BaseModel):
     error: str = None
 
 
-def get_candidate_solution(exc, temp_patch_file):
+def get_packages(snapshot: CrashSnapshot, additional_definitions):
+    if not RELEVANT_PACKAGES_ONLY:
+        return package_inventory.get_packages()
+
+    file_paths = [d.file_path for d in additional_definitions.values()] + [f.file_path for f in snapshot.frames]
+    return package_inventory.get_relevant_packages(file_paths)
+
+
+def get_payload(snapshot: CrashSnapshot):
+    """Returns the payload and the fingerprint of its fix"""
+    with metrics.span('payload_building'):
+        environments, additional_definitions = get_environments_and_defs(snapshot)
+        stacktrace_str = snapshot.stacktrace_str
+        packages = get_packages(snapshot, additional_definitions)
+        environments, additional_definitions = pack(environments, additional_definitions,
+                                                    fixed_size=len(stacktrace_str) + len(json.dumps(packages)))
+
+        if environments:  # needs at least 1 environment
+            max_index = max([e.index for e in environments])
+            for idx, (name, defi) in enumerate(additional_definitions.items()):
+                defi.index = max_index + idx + 1
+                additional_definitions[name] = defi
+
+        payload = Payload(
+            packages=packages,
+            stacktrace_str=stacktrace_str,
+            environments=environments,
+            additional_definitions=additional_definitions
+        )
+        fix_fingerprint = get_fix_fingerprint(snapshot.fingerprint, get_payload_codes(payload))
+        return payload, fix_fingerprint
+
+
+def spool_payload(snapshot: CrashSnapshot):
+    """In spool mode the crash is only written to disk, `crashless replay` asks for its fix later."""
+    payload, fix_fingerprint = get_payload(snapshot)
+    record = {'fingerprint': fix_fingerprint, 'created_at': time.time(), 'attempts': 0, 'payload': payload.dict()}
+    with metrics.span('spooling'):
+        get_spool().append(record)
+
+
+def get_candidate_solution(snapshot: CrashSnapshot):
+    if MODE == SPOOL_MODE:
+        return spool_payload(snapshot)
+
     print_with_color("Crashless detected an error, let's fix it!", BColors.WARNING)
-    environments, additional_definitions = get_environments_and_defs(exc)
-
-    if environments:  # needs at least 1 environment
-        max_index = max([e.index for e in environments])
-        for idx, (name, defi) in enumerate(additional_definitions.items()):
-            defi.index = max_index + idx + 1
-            additional_definitions[name] = defi
-
-    stacktrace_str = get_stacktrace(exc)
-    payload = Payload(
-        packages=list(freeze.freeze()),
-        stacktrace_str=stacktrace_str,
-        environments=environments,
-        additional_definitions=additional_definitions
-    )
-    return get_solution(payload, temp_patch_file)
+    payload, fix_fingerprint = get_payload(snapshot)
+    return get_solution(payload, fix_fingerprint)
+
 
+async def get_candidate_solution_async(snapshot: CrashSnapshot):
+    """Same as get_candidate_solution, but the event loop only waits on the network, the rest runs on its executor."""
+    loop = asyncio.get_running_loop()
+    if MODE == SPOOL_MODE:
+        return await loop.run_in_executor(None, spool_payload, snapshot)
 
-def get_content_message(exc):
-    return {
-        'error': str(exc),
-        'action': 'Check terminal to see a possible solution',
-    }
+    print_with_color("Crashless detected an error, let's fix it!", BColors.WARNING)
+    payload, fix_fingerprint = await loop.run_in_executor(None, get_payload, snapshot)
+
+    code_fix = await loop.run_in_executor(None, get_code_fix_from_cache, fix_fingerprint)
+    if code_fix is None:
+        code_fix = await get_code_fix_async(payload)
+        await loop.run_in_executor(None, cache_code_fix, fix_fingerprint, code_fix)
+
+    return await loop.run_in_executor(None, get_solution_from_code_fix, payload, code_fix)
+
+
+def show_solution(solution):
+    with prompt_lock:  # one solution at a time, so prompts don't mix in the terminal.
+        show_solution_unlocked(solution)
 
 
-def threaded_function(exc):
-    with tempfile.NamedTemporaryFile(mode='r+') as temp_patch_file:
-        temp_patch_file.flush()  # makes sure that contents are written to file
-        solution = get_candidate_solution(exc, temp_patch_file)
+def show_solution_unlocked(solution):
+    if solution.error:  # No changes but with explanation.
+        print_with_color("There was an error in crashless :(, please report it", BColors.WARNING)
+        print_with_color(f'Error: {add_newline_every_n_chars(solution.error)}', BColors.FAIL)
+        return
+
+    if solution.not_found:
+        print_with_color("No solution found :(, we'll try harder next time", BColors.WARNING)
+        return
+
+    if not solution.diffs and solution.explanation:  # No changes but with explanation.
+        print_with_color("There's no code to change, but we have a possible explanation.", BColors.WARNING)
+        print_with_color(f'Explanation: {add_newline_every_n_chars(solution.explanation)}', BColors.OKBLUE)
+        return
 
-        if solution.error:  # No changes but with explanation.
-            print_with_color("There was an error in crashless :(, please report it", BColors.WARNING)
-            print_with_color(f'Error: {add_newline_every_n_chars(solution.error)}', BColors.FAIL)
-            return
+    ask_to_fix_code(solution)
+
+
+def claim_crash(snapshot: CrashSnapshot):
+    """With a shared store only one process analyzes each crash, returns None when another one does or just did."""
+    store = get_store()
+    if store is None:
+        return UNCLAIMED  # every process analyzes its crashes.
+    try:
+        owner = store.claim(snapshot.fingerprint)
+    except sqlite3.Error:
+        return UNCLAIMED  # a broken store can't stop the analysis.
+
+    if owner is None:
+        metrics.increment('crashes_deduped')
+    return owner
+
+
+def release_crash(snapshot: CrashSnapshot, owner, is_done):
+    if owner == UNCLAIMED:
+        return
+    try:
+        get_store().release(snapshot.fingerprint, owner, is_done)
+    except sqlite3.Error:
+        pass
+
+
+def threaded_function(snapshot: CrashSnapshot):
+    owner = claim_crash(snapshot)
+    if owner is None:
+        return
+
+    solution = None
+    is_done = False
+    try:
+        solution = get_candidate_solution(snapshot)
+        is_done = solution is None or solution.error is None  # errors can be transient, others can try again.
+    finally:
+        release_crash(snapshot, owner, is_done)
+
+    if solution is not None:  # None when spooled.
+        show_solution(solution)
+
+
+async def async_function(snapshot: CrashSnapshot):
+    loop = asyncio.get_running_loop()
+    owner = await loop.run_in_executor(None, claim_crash, snapshot)
+    if owner is None:
+        return
+
+    solution = None
+    is_done = False
+    try:
+        solution = await get_candidate_solution_async(snapshot)
+        is_done = solution is None or solution.error is None  # errors can be transient, others can try again.
+    finally:
+        await loop.run_in_executor(None, release_crash, snapshot, owner, is_done)
 
-        if solution.not_found:
-            print_with_color("No solution found :(, we'll try harder next time", BColors.WARNING)
-            return
+    if solution is not None:  # None when spooled.
+        await loop.run_in_executor(None, show_solution, solution)
 
-        if not solution.diffs and solution.explanation:  # No changes but with explanation.
-            print_with_color("There's no code to change, but we have a possible explanation.", BColors.WARNING)
-            print_with_color(f'Explanation: {add_newline_every_n_chars(solution.explanation)}', BColors.OKBLUE)
-            return
 
-        ask_to_fix_code(solution, temp_patch_file)
+prompt_lock = threading.Lock()
@@ -0,0 +1,119 @@
+import json
+import time
+import atexit
+import threading
+import traceback
+from contextlib import contextmanager
+
+from crashless.cts import METRICS_FILE
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+TIMING = 'timing'
+
+
+class Timing:
+    __slots__ = ('count', 'total', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'avg': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'last': self.last,
+        }
+
+
+class MetricsRegistry:
+    """
+    In memory counters, gauges and stage timings of the crash handling. Can be scraped with get_snapshot() or dumped
+    as json. Hooks are called with (kind, name, value) on every record, to forward them to statsd, prometheus, logs...
+    """
+
+    def __init__(self):
+        self.counters = dict()
+        self.gauges = dict()
+        self.timings = dict()
+        self.hooks = []
+        self.lock = threading.Lock()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        self._call_hooks(COUNTER, name, value)
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+        self._call_hooks(GAUGE, name, value)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = Timing()
+            timing.add(seconds)
+        self._call_hooks(TIMING, name, seconds)
+
+    @contextmanager
+    def span(self, name):
+        """Times the block as a stage, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def _call_hooks(self, kind, name, value):
+        for hook in list(self.hooks):
+            try:
+                hook(kind, name, value)
+            except Exception:  # a broken hook can't break the crash handling.
+                traceback.print_exc()
+
+    def get_snapshot(self):
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'timings': {name: timing.to_dict() for name, timing in self.timings.items()},
+            }
+
+    def dump(self, path=None):
+        """Returns the metrics as json, and writes them to path if given."""
+        content = json.dumps(self.get_snapshot(), indent=2, sort_keys=True)
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write(content)
+        return content
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.timings.clear()
+
+
+metrics = MetricsRegistry()
+
+if METRICS_FILE:
+    atexit.register(metrics.dump, METRICS_FILE)
@@ -0,0 +1,106 @@
+import os
+import sys
+import threading
+from importlib import metadata
+
+# Same packages that pip freeze leaves out.
+EXCLUDED_PACKAGES = {'pip', 'setuptools', 'wheel', 'distribute'}
+IGNORED_TOP_LEVEL_DIRS = ('..', '__pycache__')
+METADATA_DIR_SUFFIXES = ('.dist-info', '.egg-info', '.data')
+
+
+def get_requirement(distribution):
+    return f"{distribution.metadata['Name']}=={distribution.version}"
+
+
+def get_top_level_names(distribution):
+    """Importable names a distribution installs, ie: 'yaml' for PyYAML"""
+    top_level = distribution.read_text('top_level.txt')
+    if top_level:
+        return set(top_level.split())
+
+    names = set()
+    for file in distribution.files or []:
+        name = file.parts[0]
+        if name.endswith('.py'):
+            names.add(name[:-len('.py')])
+        elif len(file.parts) > 1 and not name.endswith(METADATA_DIR_SUFFIXES) and name not in IGNORED_TOP_LEVEL_DIRS:
+            names.add(name)
+    return names
+
+
+def get_path_entries_version():
+    """Installing or removing packages changes the modification time of the directories they are installed in."""
+    version = []
+    for path_entry in sys.path:
+        try:
+            version.append((path_entry, os.stat(path_entry or '.').st_mtime_ns))
+        except OSError:
+            version.append((path_entry, None))
+    return tuple(version)
+
+
+class PackageInventory:
+    """Installed packages, computed once and again only when sys.path or its directories change."""
+
+    def __init__(self):
+        self.version = None
+        self.packages = []
+        self.top_level_packages = dict()  # importable name -> requirements
+        self.lock = threading.Lock()
+
+    def _refresh(self):
+        version = get_path_entries_version()
+        if version == self.version:
+            return
+
+        packages = dict()
+        top_level_packages = dict()
+        seen_names = set()
+        for distribution in metadata.distributions():
+            name = distribution.metadata['Name']
+            if not name or name.lower() in seen_names:  # the first one found in sys.path is the one imported.
+                continue
+            seen_names.add(name.lower())
+            requirement = get_requirement(distribution)
+            if name.lower() not in EXCLUDED_PACKAGES:
+                packages[name.lower()] = requirement
+            for top_level_name in get_top_level_names(distribution):
+                top_level_packages.setdefault(top_level_name, []).append(requirement)
+
+        self.packages = sorted(packages.values(), key=str.lower)
+        self.top_level_packages = top_level_packages
+        self.version = version
+
+    def get_packages(self):
+        with self.lock:
+            self._refresh()
+            return list(self.packages)
+
+    def get_relevant_packages(self, file_paths):
+        """Packages owning any of the files"""
+        with self.lock:
+            self._refresh()
+            requirements = set()
+            for file_path in file_paths:
+                requirements.update(self.top_level_packages.get(get_top_level_name(file_path), []))
+            return sorted(requirements, key=str.lower)
+
+
+def get_top_level_name(file_path):
+    """First component of the file's path, relative to the sys.path entry it's imported from."""
+    file_path = os.path.abspath(file_path)
+    best_path_entry = ''
+    for path_entry in sys.path:
+        path_entry = os.path.join(os.path.abspath(path_entry or '.'), '')
+        if file_path.startswith(path_entry) and len(path_entry) > len(best_path_entry):
+            best_path_entry = path_entry
+
+    if not best_path_entry:
+        return None
+
+    top_level_name = file_path[len(best_path_entry):].split(os.sep)[0]
+    return top_level_name[:-len('.py')] if top_level_name.endswith('.py') else top_level_name
+
+
+package_inventory = PackageInventory()
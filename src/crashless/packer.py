@@ -0,0 +1,54 @@
+from crashless.cts import DEBUG, MAX_CHAR_WITH_BOUND
+from crashless.metrics import metrics
+
+ENTRY_OVERHEAD = 4  # quotes, colon and comma around each entry of the json.
+
+ENVIRONMENT = 0
+DEFINITION = 1
+
+
+def get_code_size(code, name=None):
+    size = len(code.json()) + ENTRY_OVERHEAD
+    return size + len(name) if name is not None else size
+
+
+def pack(environments, definitions, fixed_size, max_chars=MAX_CHAR_WITH_BOUND):
+    """
+    Fills the characters budget of the payload with the most relevant code first: code closer on the call graph to
+    the crashing line goes first, environments before definitions on ties. Each size is computed once, and what doesn't
+    fit is skipped, so smaller pieces further away can still use the remaining budget. The crashing environment is
+    always kept.
+    """
+    candidates = [(e._distance, ENVIRONMENT, idx, None, e) for idx, e in enumerate(environments)]
+    candidates += [(d._distance, DEFINITION, idx, name, d) for idx, (name, d) in enumerate(definitions.items())]
+    candidates.sort(key=lambda candidate: candidate[:3])
+
+    total_chars = fixed_size
+    kept_environment_indexes = set()
+    kept_definitions = dict()
+    skipped_chars = 0
+    for distance, kind, idx, name, code in candidates:
+        size = get_code_size(code, name)
+        is_crashing_environment = kind == ENVIRONMENT and distance == 0
+        if total_chars + size > max_chars and not is_crashing_environment:
+            skipped_chars += size
+            continue
+
+        total_chars += size
+        if kind == ENVIRONMENT:
+            kept_environment_indexes.add(idx)
+        else:
+            kept_definitions[name] = code
+
+    metrics.increment('payload_chars_skipped', skipped_chars)
+    if DEBUG and skipped_chars:
+        print(f'CHARS_LIMIT exceeded, {total_chars=} and {skipped_chars=} left out of the payload')
+
+    kept_environments = []
+    for idx, environment in enumerate(environments):
+        if idx in kept_environment_indexes:
+            environment.used_additional_definitions = [name for name in environment.used_additional_definitions
+                                                       if name in kept_definitions]
+            kept_environments.append(environment)
+
+    return kept_environments, kept_definitions
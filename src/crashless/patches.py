@@ -0,0 +1,247 @@
+import os
+import shutil
+import difflib
+import tempfile
+
+DIFF_CONTEXT_LINES = 3
+NO_NEWLINE_MARKER = '\\ No newline at end of file\n'
+
+_git_roots = dict()  # working directory -> root of its git repo, '' when there's none.
+
+
+def find_git_root(path):
+    """Same as git rev-parse --show-toplevel, without running git"""
+    path = os.path.abspath(path)
+    while True:
+        if os.path.exists(os.path.join(path, '.git')):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return ''
+        path = parent
+
+
+def get_git_root():
+    cwd = os.getcwd()
+    git_root = _git_roots.get(cwd)
+    if git_root is None:
+        git_root = find_git_root(cwd)
+        _git_roots[cwd] = git_root
+    return git_root
+
+
+def get_git_path(absolute_path):
+    root_of_git = get_git_root()
+    if root_of_git:  # There's a git repo on the path.
+        # Removes the absolute path part, and uses relatives paths to that .git file.
+        return absolute_path.replace(root_of_git, '')
+    else:
+        # There's no .git on the path, will use absolute paths.
+        return f'/{absolute_path}'  # Needs to add a / to read the absolute path
+
+
+def split_lines(text):
+    """Lines with their ends, like str.splitlines(keepends=True), but as for git only newlines end them, form feeds or
+    line separators are part of the line."""
+    lines = [f'{line}\n' for line in text.split('\n')]
+    last_line = lines.pop()[:-1]
+    if last_line:  # the file doesn't end with a newline.
+        lines.append(last_line)
+    return lines
+
+
+def format_range(start, stop):
+    """Range of a hunk header, in the same format as git and GNU diff"""
+    beginning = start + 1  # lines start at 1
+    length = stop - start
+    if length == 1:
+        return f'{beginning}'
+    if not length:
+        beginning -= 1  # empty ranges begin at the line before.
+    return f'{beginning},{length}'
+
+
+def get_diff_lines(prefix, lines):
+    diff_lines = []
+    for line in lines:
+        diff_lines.append(f'{prefix}{line}')
+        if not line.endswith('\n'):  # last line of a file without a newline.
+            diff_lines.append(f'\n{NO_NEWLINE_MARKER}')
+    return diff_lines
+
+
+def get_hunks(old_code, new_code, context=DIFF_CONTEXT_LINES):
+    """List of (header, body) of each changed part."""
+    old_lines = split_lines(old_code)
+    new_lines = split_lines(new_code)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+
+    hunks = []
+    for group in matcher.get_grouped_opcodes(context):
+        _, old_start, _, new_start, _ = group[0]
+        _, _, old_end, _, new_end = group[-1]
+        header = f'@@ -{format_range(old_start, old_end)} +{format_range(new_start, new_end)} @@\n'
+        body_lines = []
+        for tag, old_first, old_last, new_first, new_last in group:
+            if tag == 'equal':
+                body_lines += get_diff_lines(' ', old_lines[old_first:old_last])
+                continue
+            if tag in ('replace', 'delete'):
+                body_lines += get_diff_lines('-', old_lines[old_first:old_last])
+            if tag in ('replace', 'insert'):
+                body_lines += get_diff_lines('+', new_lines[new_first:new_last])
+        hunks.append((header, ''.join(body_lines)))
+
+    return hunks
+
+
+def get_patch(path, hunks):
+    """Patch in the format of git diff, that git apply understands"""
+    if not hunks:
+        return ''
+    file_header = f'diff --git a{path} b{path}\n--- a{path}\n+++ b{path}\n'
+    return file_header + ''.join(header + body for header, body in hunks)
+
+
+def get_absolute_path(git_path):
+    """Inverse of get_git_path"""
+    root_of_git = get_git_root()
+    return f'{root_of_git}{git_path}' if root_of_git else git_path[1:]
+
+
+class PatchError(Exception):
+    pass
+
+
+class Hunk:
+    __slots__ = ('old_start', 'old_count', 'new_count', 'old_lines', 'new_lines')
+
+    def __init__(self, old_start, old_count, new_count):
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_count = new_count
+        self.old_lines = []
+        self.new_lines = []
+
+    def is_complete(self):
+        return len(self.old_lines) >= self.old_count and len(self.new_lines) >= self.new_count
+
+
+def parse_range(hunk_range):
+    """Start and count of a range, the count is 1 when it's left out: start[,count]"""
+    start, _, count = hunk_range.partition(',')
+    return int(start), int(count) if count else 1
+
+
+def parse_hunk_header(line):
+    """
+    Hunk with the line where it starts on the old file, 0 based, and its line counts, from:
+    @@ -old_start[,old_count] +new_start[,new_count] @@
+    """
+    try:
+        _, old_range, new_range = line.split(' ')[:3]
+        old_start, old_count = parse_range(old_range[1:])
+        _, new_count = parse_range(new_range[1:])
+    except ValueError:
+        raise PatchError(f'Invalid hunk header: {line!r}')
+    return Hunk(old_start if old_count == 0 else old_start - 1, old_count, new_count)
+
+
+def parse_patch(patch_content):
+    """
+    Dict of path -> list of hunks, for patches in the format of git diff. Each hunk takes exactly the lines its header
+    counts, so the headers of the next file are never read as part of it.
+    """
+    file_hunks = dict()
+    hunks = None
+    hunk = None
+    last_lists = []
+    for line in split_lines(patch_content):
+        if line.startswith(NO_NEWLINE_MARKER[:-1]):
+            for lines in last_lists:
+                lines[-1] = lines[-1][:-1]  # the last line had no newline.
+        elif hunk is not None and not hunk.is_complete():
+            prefix, content = line[:1], line[1:]
+            if prefix not in (' ', '-', '+'):
+                raise PatchError(f'Hunk shorter than its header, at: {line!r}')
+            last_lists = {' ': [hunk.old_lines, hunk.new_lines], '-': [hunk.old_lines], '+': [hunk.new_lines]}[prefix]
+            for lines in last_lists:
+                lines.append(content)
+        elif line.startswith('+++ b'):
+            hunks = file_hunks.setdefault(line[len('+++ b'):].rstrip('\n'), [])
+        elif line.startswith('@@'):
+            if hunks is None:
+                raise PatchError('Hunk without a file')
+            hunk = parse_hunk_header(line)
+            hunks.append(hunk)
+
+    if hunk is not None and not hunk.is_complete():
+        raise PatchError('Patch ends in the middle of a hunk')
+    return file_hunks
+
+
+def apply_hunks(code, hunks, path, previous_hunks=()):
+    """
+    The code must still have the lines each hunk replaces, otherwise the file changed since the patch was made. Hunks
+    are on the original file, the lines added or removed above them by the previous hunks of the batch are accounted.
+    """
+    lines = split_lines(code)
+    applied_hunks = list(previous_hunks)
+    for hunk in hunks:
+        # lines added minus removed by the hunks above
+        offset = sum(len(h.new_lines) - len(h.old_lines) for h in applied_hunks if h.old_start <= hunk.old_start)
+        start = hunk.old_start + offset
+        end = start + len(hunk.old_lines)
+        if lines[start:end] != hunk.old_lines:
+            raise PatchError(f'{path} changed since the fix was computed, line {start + 1} does not match')
+        lines[start:end] = hunk.new_lines
+        applied_hunks.append(hunk)
+    return ''.join(lines)
+
+
+def write_atomically(path, content):
+    """Writes to a temp file on the same directory and renames it, so the file is never half written."""
+    file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.crashless-', suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'w', newline='') as temp_file:
+            temp_file.write(content)
+        shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def apply_patches(patches, get_path=get_absolute_path):
+    """
+    Applies all the patches or none: every hunk is validated on the current content of its file before anything is
+    written, and if a file can't be written the ones already written are restored.
+    """
+    old_codes = dict()
+    new_codes = dict()
+    applied_hunks = dict()  # path -> hunks of the previous patches, all computed on the original file.
+    for patch_content in patches:
+        for patch_path, hunks in parse_patch(patch_content).items():
+            path = get_path(patch_path)
+            if path not in new_codes:
+                try:
+                    with open(path, 'r', newline='') as file_code:  # line ends are kept as they are, ie: \r\n
+                        old_codes[path] = new_codes[path] = file_code.read()
+                except OSError as error:
+                    raise PatchError(f'Cannot read {path}: {error}')
+                applied_hunks[path] = []
+            new_codes[path] = apply_hunks(new_codes[path], hunks, path, applied_hunks[path])
+            applied_hunks[path] += hunks
+
+    written_paths = []
+    try:
+        for path, new_code in new_codes.items():
+            write_atomically(path, new_code)
+            written_paths.append(path)
+    except OSError as error:
+        for path in written_paths:
+            write_atomically(path, old_codes[path])
+        raise PatchError(f'Cannot write {path}: {error}')
+
+    return list(new_codes)
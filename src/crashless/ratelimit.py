@@ -0,0 +1,116 @@
+import time
+import random
+import threading
+from collections import OrderedDict
+
+from crashless.cts import (CRASH_RATE_PER_MINUTE, CRASH_BURST, GLOBAL_CRASH_RATE_PER_MINUTE, GLOBAL_CRASH_BURST,
+                           CRASH_SAMPLE_THRESHOLD, CRASH_SAMPLE_RATE, RATE_LIMIT_MAX_CRASHES)
+from crashless.metrics import metrics
+from crashless.symbols import path_is_in_user_code
+
+# Outcomes of a check
+ALLOWED = 'allowed'
+RATE_LIMITED = 'rate_limited'
+SAMPLED_OUT = 'sampled_out'
+
+
+def get_crash_key(exc):
+    """
+    Cheap identity of a crash, taken before any frame is walked: the exception type and the innermost line of user code
+    it went through, or where it was raised when no user code did. Only pointers and file names are read, no source or
+    local.
+    """
+    stacktrace_level = exc.__traceback__
+    if stacktrace_level is None:
+        return type(exc), None, None
+    user_level = None
+    while True:
+        if path_is_in_user_code(stacktrace_level.tb_frame.f_code.co_filename):
+            user_level = stacktrace_level
+        if stacktrace_level.tb_next is None:
+            break
+        stacktrace_level = stacktrace_level.tb_next
+    key_level = user_level or stacktrace_level  # library crashes are told apart by the user code calling them.
+    return type(exc), key_level.tb_frame.f_code, key_level.tb_lineno
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+
+    def take(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CrashLimiter:
+    """
+    Decides if a crash is analyzed. Each crash has a token bucket, and all crashes share another one. A crash seen
+    more than sample_threshold times is also sampled at sample_rate. Only the most recently seen crashes are tracked.
+    """
+
+    def __init__(self, rate_per_minute=CRASH_RATE_PER_MINUTE, burst=CRASH_BURST,
+                 global_rate_per_minute=GLOBAL_CRASH_RATE_PER_MINUTE, global_burst=GLOBAL_CRASH_BURST,
+                 sample_threshold=CRASH_SAMPLE_THRESHOLD, sample_rate=CRASH_SAMPLE_RATE,
+                 max_crashes=RATE_LIMIT_MAX_CRASHES):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.sample_threshold = sample_threshold
+        self.sample_rate = sample_rate
+        self.max_crashes = max_crashes
+        self.global_bucket = TokenBucket(global_rate_per_minute / 60, global_burst, time.monotonic())
+        self.crashes = OrderedDict()  # crash key -> [token bucket, occurrences]
+        self.lock = threading.Lock()
+
+        # Counters
+        self.allowed = 0
+        self.rate_limited = 0
+        self.sampled_out = 0
+
+    def check(self, crash_key):
+        now = time.monotonic()
+        with self.lock:
+            outcome = self._check(crash_key, now)
+            setattr(self, outcome, getattr(self, outcome) + 1)
+        metrics.increment(f'crashes_{outcome}')
+        return outcome
+
+    def allow(self, crash_key):
+        return self.check(crash_key) == ALLOWED
+
+    def _check(self, crash_key, now):
+        crash = self.crashes.get(crash_key)
+        if crash is None:
+            crash = self.crashes[crash_key] = [TokenBucket(self.rate, self.burst, now), 0]
+            if len(self.crashes) > self.max_crashes:
+                self.crashes.popitem(last=False)  # forgets the least recently seen.
+        else:
+            self.crashes.move_to_end(crash_key)
+
+        crash[1] += 1
+        if crash[1] > self.sample_threshold and random.random() >= self.sample_rate:
+            return SAMPLED_OUT
+        if not crash[0].take(now) or not self.global_bucket.take(now):
+            return RATE_LIMITED
+        return ALLOWED
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'allowed': self.allowed,
+                'rate_limited': self.rate_limited,
+                'sampled_out': self.sampled_out,
+                'tracked_crashes': len(self.crashes),
+            }
+
+
+crash_limiter = CrashLimiter()
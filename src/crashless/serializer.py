@@ -0,0 +1,169 @@
+import time
+import reprlib
+import weakref
+from collections import deque
+
+from crashless.cts import LOCAL_VAR_MAX_CHARS, LOCAL_VARS_MAX_CHARS, LOCAL_VARS_MAX_SECONDS
+
+CONTAINER_HEAD_SIZE = 10
+TRUNCATION_MARKER = '...'
+CONTAINER_TYPES = (list, tuple, set, frozenset, dict, deque)
+HUGE_TEXT_CHARS = 1_000_000  # types whose str is longer are summarized from then on, without calling it again.
+
+summarizers = dict()  # qualified type name -> function(value) -> str
+huge_text_types = weakref.WeakKeyDictionary()  # type -> length of its last str
+
+
+def get_type_name(the_class):
+    return f'{the_class.__module__}.{the_class.__qualname__}'
+
+
+def register_summarizer(type_name, summarizer):
+    """
+    Registers a cheap text for a type, by its qualified name so its library isn't imported, ie: 'numpy.ndarray'.
+    Subclasses use it too.
+    """
+    summarizers[type_name] = summarizer
+
+
+def get_summarizer(value):
+    for the_class in type(value).__mro__:
+        summarizer = summarizers.get(get_type_name(the_class))
+        if summarizer is not None:
+            return summarizer
+    return None
+
+
+def truncate(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    return text[:max(max_chars - len(TRUNCATION_MARKER), 0)] + TRUNCATION_MARKER
+
+
+def get_buffer(value):
+    """Memory view of objects holding raw memory, ie: array.array or mmap, None for other objects."""
+    try:
+        return memoryview(value)
+    except TypeError:
+        return None
+
+
+def get_buffer_head(buffer, max_bytes):
+    """First bytes, copying only them."""
+    try:
+        return buffer.cast('B')[:max_bytes].tobytes()
+    except (TypeError, ValueError):  # not contiguous, or a format that can't be cast.
+        return b''
+
+
+class BoundedRepr(reprlib.Repr):
+    """
+    Repr that stops at the first items of containers, and uses str for other objects like str() used to. Strings and
+    bytes are cut before they are repr'd, so their size doesn't matter.
+    """
+
+    def __init__(self, max_chars):
+        super().__init__()
+        self.maxlevel = 3
+        self.maxlist = self.maxtuple = self.maxset = self.maxfrozenset = self.maxdeque = CONTAINER_HEAD_SIZE
+        self.maxdict = CONTAINER_HEAD_SIZE
+        self.maxstring = max_chars
+        self.maxlong = max_chars
+        self.maxother = max_chars
+
+    def repr1(self, x, level):
+        summarizer = get_summarizer(x)
+        if summarizer is not None:
+            return truncate(summarizer(x), self.maxother)
+        return super().repr1(x, level)
+
+    def repr_str(self, x, level):
+        return repr(truncate(x, self.maxstring))
+
+    def repr_bytes(self, x, level):
+        if len(x) <= self.maxstring:
+            return repr(x)
+        return f'<{type(x).__name__} len={len(x)}> {bytes(x[:self.maxstring])!r}'
+
+    def repr_bytearray(self, x, level):
+        return self.repr_bytes(x, level)
+
+    def repr_memoryview(self, x, level):
+        return f'<{type(x).__name__} nbytes={x.nbytes}> {get_buffer_head(x, self.maxstring)!r}'
+
+    def repr_instance(self, x, level):
+        if isinstance(x, str):  # subclasses
+            return self.repr_str(x, level)
+        if isinstance(x, (bytes, bytearray)):
+            return self.repr_bytes(x, level)
+        buffer = get_buffer(x)
+        if buffer is not None:
+            return f'<{type(x).__name__} nbytes={buffer.nbytes}> {get_buffer_head(buffer, self.maxstring)!r}'
+
+        # a str can't be stopped once called, but a type is only allowed once to make a huge one.
+        text_length = huge_text_types.get(type(x))
+        if text_length is not None:
+            return f'<{get_type_name(type(x))}, str of {text_length} chars>'
+        text = str(x)
+        if len(text) > HUGE_TEXT_CHARS:
+            huge_text_types[type(x)] = len(text)
+        return truncate(text, self.maxother)
+
+
+def summarize_shape(value):
+    """Arrays, tensors and frames: their shape and type instead of their values."""
+    dtype = getattr(value, 'dtype', None)
+    dtype_text = f' dtype={dtype}' if dtype is not None else ''
+    return f'<{type(value).__name__} shape={tuple(value.shape)}{dtype_text}>'
+
+
+def summarize_data_frame(value):
+    columns = list(value.columns[:CONTAINER_HEAD_SIZE])
+    return f'<{type(value).__name__} shape={tuple(value.shape)} columns={columns}>'
+
+
+def summarize_query_set(value):
+    """Never evaluates it, that would run a query."""
+    result_cache = getattr(value, '_result_cache', None)
+    state = f'{len(result_cache)} results' if result_cache is not None else 'not evaluated'
+    return f'<{type(value).__name__} of {value.model.__name__}, {state}>'
+
+
+register_summarizer('numpy.ndarray', summarize_shape)
+register_summarizer('torch.Tensor', summarize_shape)
+register_summarizer('pandas.core.series.Series', summarize_shape)
+register_summarizer('pandas.core.frame.DataFrame', summarize_data_frame)
+register_summarizer('django.db.models.query.QuerySet', summarize_query_set)
+
+
+def serialize_value(value, max_chars=LOCAL_VAR_MAX_CHARS):
+    text = BoundedRepr(max_chars).repr(value)
+    if isinstance(value, CONTAINER_TYPES) and len(value) > CONTAINER_HEAD_SIZE:
+        text = f'<{type(value).__name__} len={len(value)}> {text}'
+    return truncate(text, max_chars)
+
+
+def serialize_local_vars(local_vars, max_chars_per_var=LOCAL_VAR_MAX_CHARS, max_chars=LOCAL_VARS_MAX_CHARS,
+                         max_seconds=LOCAL_VARS_MAX_SECONDS):
+    """
+    Text of the local variables within a characters and a time budget. The time is checked between variables, so a
+    single slow __str__ can still exceed it, but no more variables are serialized after it.
+    """
+    start_time = time.monotonic()
+    var_dict = {}
+    total_chars = 0
+    # cannot call item here cause will explode if a local variable has an exception.
+    for name in list(local_vars.keys()):
+        if time.monotonic() - start_time > max_seconds or total_chars >= max_chars:
+            break
+
+        try:
+            # Can only call the value inside the try except.
+            value_text = serialize_value(local_vars[name], min(max_chars_per_var, max_chars - total_chars))
+        except Exception:
+            continue
+
+        var_dict[name] = value_text
+        total_chars += len(name) + len(value_text)
+
+    return str(var_dict)
@@ -0,0 +1,134 @@
+import time
+import inspect
+import traceback
+
+from crashless.cts import (LOCAL_VARS_MAX_CHARS, LOCAL_VARS_MAX_SECONDS, SNAPSHOT_LOCALS_MAX_CHARS,
+                           SNAPSHOT_LOCALS_MAX_SECONDS)
+from crashless.metrics import metrics
+from crashless.serializer import serialize_local_vars
+from crashless.symbols import path_is_in_user_code
+from crashless.cache import get_crash_fingerprint, get_exception_name
+
+EMPTY_LOCAL_VARS_STR = str({})  # locals of the user frames left out of the budget.
+
+
+class FrameSnapshot:
+    """What the analysis needs from a frame. Locals are kept as text, and only the user defined classes of their
+    values, so the frame itself can be released."""
+    __slots__ = ('file_path', 'function_name', 'line_number', 'module_name', 'is_user_code', 'local_vars_str',
+                 'local_classes')
+
+    def __init__(self, file_path, function_name, line_number, module_name, is_user_code, local_vars_str=None,
+                 local_classes=()):
+        self.file_path = file_path
+        self.function_name = function_name
+        self.line_number = line_number
+        self.module_name = module_name
+        self.is_user_code = is_user_code
+        self.local_vars_str = local_vars_str
+        self.local_classes = local_classes
+
+
+class CrashSnapshot:
+    __slots__ = ('exception_name', 'message', 'stacktrace_str', 'frames', 'fingerprint')
+
+    def __init__(self, exception_name, message, stacktrace_str, frames):
+        self.exception_name = exception_name
+        self.message = message
+        self.stacktrace_str = stacktrace_str
+        self.frames = frames
+        user_frames = [(f.file_path, f.function_name, f.line_number) for f in self.user_frames]
+        self.fingerprint = get_crash_fingerprint(exception_name, user_frames)
+
+    @property
+    def user_frames(self):
+        return [frame for frame in self.frames if frame.is_user_code]
+
+
+def get_local_classes(local_vars):
+    """User defined classes of the local values, and local classes."""
+    classes = []
+    for name in list(local_vars.keys()):
+        try:
+            var = local_vars[name]
+            the_class = var if inspect.isclass(var) else var.__class__
+            if the_class not in classes and path_is_in_user_code(inspect.getfile(the_class)):
+                classes.append(the_class)
+        except Exception:  # Calling local vars can randomly raise an error
+            pass
+    return classes
+
+
+def get_local_vars_str(local_vars, max_chars=LOCAL_VARS_MAX_CHARS, max_seconds=LOCAL_VARS_MAX_SECONDS):
+    with metrics.span('serialization'):
+        return serialize_local_vars(local_vars, max_chars=max_chars, max_seconds=max_seconds)
+
+
+class LocalsBudget:
+    """Characters and time shared by the locals of all the frames of a snapshot, so deep recursions stay bounded."""
+    __slots__ = ('chars_left', 'deadline')
+
+    def __init__(self, max_chars=SNAPSHOT_LOCALS_MAX_CHARS, max_seconds=SNAPSHOT_LOCALS_MAX_SECONDS):
+        self.chars_left = max_chars
+        self.deadline = time.monotonic() + max_seconds
+
+    def is_spent(self):
+        return self.chars_left <= 0 or time.monotonic() >= self.deadline
+
+    def get_local_vars_str(self, local_vars):
+        local_vars_str = get_local_vars_str(local_vars, max_chars=min(LOCAL_VARS_MAX_CHARS, self.chars_left),
+                                            max_seconds=min(LOCAL_VARS_MAX_SECONDS, self.deadline - time.monotonic()))
+        self.chars_left -= len(local_vars_str)
+        return local_vars_str
+
+
+def get_stacktrace(exc):
+    return "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+
+
+def take_snapshot(exc):
+    """
+    Cheap and bounded copy of what the analysis needs, taken where the exception is handled. The rest of the
+    analysis works on it, so the exception, its traceback and all the locals can be released right away.
+    """
+    with metrics.span('frame_walking'):
+        return get_snapshot(exc)
+
+
+def get_frame_snapshot(stacktrace_level, budget):
+    frame = stacktrace_level.tb_frame
+    file_path = frame.f_code.co_filename
+    is_user_code = path_is_in_user_code(file_path)
+    frame_snapshot = FrameSnapshot(
+        file_path=file_path,
+        function_name=frame.f_code.co_name,
+        line_number=stacktrace_level.tb_lineno,
+        module_name=frame.f_globals.get('__name__'),
+        is_user_code=is_user_code,
+    )
+    if is_user_code and budget.is_spent():
+        frame_snapshot.local_vars_str = EMPTY_LOCAL_VARS_STR
+    elif is_user_code:
+        frame_snapshot.local_vars_str = budget.get_local_vars_str(frame.f_locals)
+        frame_snapshot.local_classes = get_local_classes(frame.f_locals)
+    return frame_snapshot
+
+
+def get_snapshot(exc):
+    stacktrace_levels = []
+    stacktrace_level = exc.__traceback__
+    while stacktrace_level is not None:
+        stacktrace_levels.append(stacktrace_level)
+        stacktrace_level = stacktrace_level.tb_next  # Move to the next level in the stack trace
+
+    # the innermost frames are the closest to the crash, they take the budget first.
+    budget = LocalsBudget()
+    frames = [get_frame_snapshot(level, budget) for level in reversed(stacktrace_levels)]
+    frames.reverse()
+
+    return CrashSnapshot(
+        exception_name=get_exception_name(exc),
+        message=str(exc),
+        stacktrace_str=get_stacktrace(exc),
+        frames=frames,
+    )
@@ -0,0 +1,251 @@
+import os
+import ast
+import bisect
+import tokenize
+import textwrap
+import threading
+from io import BytesIO
+from collections import OrderedDict
+
+from crashless.cts import SOURCE_CACHE_MAX_CHARS
+from crashless.metrics import metrics
+
+# Parsed trees and scopes take several times the memory of the source they come from.
+MEMORY_PER_SOURCE_CHAR = 10
+MODULE_SCOPE = 0
+
+
+def get_code_lines(code):
+    lines_dict = dict()
+    tokens = list(tokenize.tokenize(BytesIO(code.encode('utf-8')).readline))
+    for token in tokens:
+        start_position = token.start
+        end_position = token.end
+        start_line = start_position[0]
+        end_line = end_position[0]
+
+        if lines_dict.get(start_line) is None and start_line > 0:
+            lines_dict[start_line] = token.line
+
+        if start_line < end_line:  # multiline token, will add missing lines
+            for idx, line in enumerate(token.line.split('\n')):
+                lines_dict[start_line + idx] = f'{line}\n'
+
+    return list(lines_dict.values())
+
+
+def get_call_name(node: ast.Call):
+    """Dotted name of the called function, ie: module.function. For calls on expressions, ie: get_x().method(), only
+    the attributes are kept."""
+    parts = []
+    function = node.func
+    while isinstance(function, ast.Attribute):
+        parts.append(function.attr)
+        function = function.value
+
+    if isinstance(function, ast.Name):
+        parts.append(function.id)
+
+    return '.'.join(reversed(parts)) or None
+
+
+def get_calls(tree):
+    """Sorted (line, name) of every call, calls inside strings or comments aren't nodes so are never found."""
+    calls = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            name = get_call_name(node)
+            if name is not None:
+                calls.append((node.lineno, node.col_offset, name))
+    calls.sort()
+    return [(line, name) for line, _, name in calls]
+
+
+def get_attributes(tree):
+    """Sorted (line, name) of every attribute accessed, ie: obj.method() or obj.field."""
+    attributes = [(node.lineno, node.col_offset, node.attr) for node in ast.walk(tree)
+                  if isinstance(node, ast.Attribute)]
+    attributes.sort()
+    return [(line, name) for line, _, name in attributes]
+
+
+def get_called_names(code):
+    """Names called in a piece of code, in order of appearance"""
+    calls = get_calls(ast.parse(textwrap.dedent(code)))
+    return list(dict.fromkeys(name for _, name in calls))
+
+
+class ScopeAnalyzer(ast.NodeVisitor):
+    """
+    Finds the innermost function or class of every line. Scopes get an integer id and their first and last lines are
+    stored, while lines are compressed into runs of consecutive lines with the same scope that are searched with
+    bisect, so memory grows with the number of scopes and not with the number of lines.
+    """
+
+    def __init__(self):
+        self.scopes = [MODULE_SCOPE]  # stack of scope ids while visiting.
+        self.scope_names = ['Module']
+        self.scope_bounds = []  # scope id -> (first line, last line)
+        self.run_starts = []  # first line of each run, sorted.
+        self.run_scope_ids = []
+        self._line_scopes = dict()  # only used while visiting.
+
+    def analyze(self, tree):
+        self.visit(tree)
+        self._build_runs()
+        return self
+
+    def _visit_scope(self, node, name):
+        self.scopes.append(len(self.scope_names))
+        self.scope_names.append(name)
+        self.generic_visit(node)
+        self.scopes.pop()
+
+    def visit_FunctionDef(self, node):
+        self._visit_scope(node, f"Function: {node.name}")
+
+    def visit_ClassDef(self, node):
+        self._visit_scope(node, f"Class: {node.name}")
+
+    def visit(self, node):
+        line_number = getattr(node, 'lineno', None)
+        # The first node of a line decides its scope, a module level line can still be taken by a nested scope.
+        if line_number is not None and self._line_scopes.get(line_number, MODULE_SCOPE) == MODULE_SCOPE:
+            self._line_scopes[line_number] = self.scopes[-1]
+        super().visit(node)
+
+    def _build_runs(self):
+        bounds = [None] * len(self.scope_names)
+        for line_number in sorted(self._line_scopes):
+            scope_id = self._line_scopes[line_number]
+            if not self.run_scope_ids or self.run_scope_ids[-1] != scope_id:
+                self.run_starts.append(line_number)
+                self.run_scope_ids.append(scope_id)
+
+            first_line = line_number if bounds[scope_id] is None else bounds[scope_id][0]
+            bounds[scope_id] = (first_line, line_number)
+
+        self.scope_bounds = bounds
+        self._line_scopes = dict()
+
+    def get_scope_id(self, line_number):
+        """Lines without code belong to the scope of the code above them."""
+        run_index = bisect.bisect_right(self.run_starts, line_number) - 1
+        return self.run_scope_ids[run_index] if run_index >= 0 else MODULE_SCOPE
+
+    def get_scope_bounds(self, scope_id):
+        """First and last lines, 1 based, of the scope."""
+        return self.scope_bounds[scope_id] or (1, 1)
+
+
+class SourceFile:
+    """Content of a file with its lines, AST and scopes, the last 2 are computed on first use."""
+
+    def __init__(self, path, content):
+        self.path = path
+        self.content = content
+        self.lines = get_code_lines(content)
+        self._tree = None
+        self._analyzer = None
+        self._calls = None
+        self._call_lines = None
+        self._attributes = None
+        self._attribute_lines = None
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            with metrics.span('parsing'):
+                self._tree = ast.parse(self.content)
+        return self._tree
+
+    @property
+    def analyzer(self):
+        if self._analyzer is None:
+            tree = self.tree
+            with metrics.span('scope_analysis'):
+                self._analyzer = ScopeAnalyzer().analyze(tree)
+        return self._analyzer
+
+    def get_called_names(self, start_line, end_line):
+        """Names called from calls starting between both lines, 1 based and inclusive, in order of appearance."""
+        if self._calls is None:
+            calls = get_calls(self.tree)
+            self._call_lines = [line for line, _ in calls]
+            self._calls = calls
+
+        start = bisect.bisect_left(self._call_lines, start_line)
+        end = bisect.bisect_right(self._call_lines, end_line)
+        return list(dict.fromkeys(name for _, name in self._calls[start:end]))
+
+    def get_attribute_names(self, start_line, end_line):
+        """Names of the attributes accessed between both lines, 1 based and inclusive, in order of appearance."""
+        if self._attributes is None:
+            attributes = get_attributes(self.tree)
+            self._attribute_lines = [line for line, _ in attributes]
+            self._attributes = attributes
+
+        start = bisect.bisect_left(self._attribute_lines, start_line)
+        end = bisect.bisect_right(self._attribute_lines, end_line)
+        return list(dict.fromkeys(name for _, name in self._attributes[start:end]))
+
+    def get_memory_size(self):
+        return len(self.content) * MEMORY_PER_SOURCE_CHAR
+
+
+class SourceCache:
+    """Process wide LRU of parsed files, an entry is valid while the file keeps the same mtime and size."""
+
+    def __init__(self, max_memory_size=SOURCE_CACHE_MAX_CHARS * MEMORY_PER_SOURCE_CHAR):
+        self.max_memory_size = max_memory_size
+        self.memory_size = 0
+        self.entries = OrderedDict()  # path -> (version, SourceFile)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                source_file = entry[1]
+            else:
+                self.misses += 1
+                source_file = None
+
+        if source_file is not None:
+            metrics.increment('source_cache_hits')
+            return source_file
+
+        metrics.increment('source_cache_misses')
+        with metrics.span('source_loading'), open(path, 'r') as file_code:
+            source_file = SourceFile(path, file_code.read())
+
+        with self.lock:
+            self._remove(path)
+            self.entries[path] = (version, source_file)
+            self.memory_size += source_file.get_memory_size()
+            while self.memory_size > self.max_memory_size and len(self.entries) > 1:
+                self._remove(next(iter(self.entries)))  # evicts the least recently used.
+        return source_file
+
+    def _remove(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.memory_size -= entry[1].get_memory_size()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.memory_size = 0
+
+
+source_cache = SourceCache()
+
+
+def get_source_file(path):
+    return source_cache.get(path)
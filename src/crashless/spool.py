@@ -0,0 +1,154 @@
+import os
+import json
+import gzip
+import time
+import zlib
+import threading
+
+from crashless.cts import SPOOL_DIR, SPOOL_SEGMENT_MAX_BYTES, SPOOL_MAX_BYTES
+from crashless.metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # not on windows, appends there are only safe within a process.
+    fcntl = None
+
+SPOOL_MODE = 'spool'
+SEGMENT_SUFFIX = '.jsonl.gz'
+CLAIMED_SUFFIX = '.replaying'
+
+
+def lock_file(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+
+
+def unlock_file(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+def is_same_file(file, path):
+    try:
+        return os.path.samestat(os.fstat(file.fileno()), os.stat(path))
+    except OSError:
+        return False
+
+
+def read_segment(path):
+    """Yields the records of a segment. A record cut by a crash while it was written ends the segment."""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                yield json.loads(line)
+    except (OSError, EOFError, zlib.error, ValueError):
+        return
+
+
+class Spool:
+    """
+    Append-only spool of crashes on disk, for replaying them later. Each record is a gzip member appended to the
+    current segment, so a write is one small append and a segment is still a valid gzip file. Segments rotate at
+    segment_max_bytes, and the oldest are deleted when all of them take more than max_bytes.
+    """
+
+    def __init__(self, path=SPOOL_DIR, segment_max_bytes=SPOOL_SEGMENT_MAX_BYTES, max_bytes=SPOOL_MAX_BYTES):
+        self.path = path
+        self.segment_max_bytes = segment_max_bytes
+        self.max_bytes = max_bytes
+        self.segment_path = None
+        self.lock = threading.Lock()
+
+    def get_segment_paths(self, suffix=SEGMENT_SUFFIX):
+        """Oldest first, the names start with the creation time."""
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.path, name) for name in sorted(names) if name.endswith(suffix)]
+
+    def _new_segment_path(self):
+        return os.path.join(self.path, f'{time.time_ns():020d}-{os.getpid()}{SEGMENT_SUFFIX}')
+
+    def append(self, record):
+        data = gzip.compress(f'{json.dumps(record)}\n'.encode('utf-8'))
+        with self.lock:
+            os.makedirs(self.path, exist_ok=True)
+            if self.segment_path is None or self._get_size(self.segment_path) >= self.segment_max_bytes:
+                self.segment_path = self._new_segment_path()
+                self._enforce_max_bytes()
+            self._write(data)
+
+        metrics.increment('spool_records')
+        metrics.increment('spool_bytes', len(data))
+
+    def _write(self, data):
+        while True:
+            with open(self.segment_path, 'ab') as file:
+                lock_file(file)
+                try:
+                    if is_same_file(file, self.segment_path):  # else it was claimed by a replay since it was opened.
+                        file.write(data)
+                        return
+                finally:
+                    unlock_file(file)
+
+    @staticmethod
+    def _get_size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def _enforce_max_bytes(self):
+        """Deletes the oldest segments, until the spool fits in max_bytes."""
+        segment_paths = self.get_segment_paths()
+        total_bytes = sum(self._get_size(path) for path in segment_paths)
+        for path in segment_paths:
+            if total_bytes <= self.max_bytes:
+                break
+            total_bytes -= self._get_size(path)
+            try:
+                os.remove(path)
+                metrics.increment('spool_dropped_segments')
+            except OSError:
+                pass
+
+    def claim_segments(self):
+        """
+        Renames the segments so new crashes go to new segments, and returns the claimed ones. Segments claimed by a
+        replay that didn't finish are claimed again.
+        """
+        claimed_paths = self.get_segment_paths(suffix=f'{SEGMENT_SUFFIX}{CLAIMED_SUFFIX}')
+        for path in self.get_segment_paths():
+            claimed_path = f'{path}{CLAIMED_SUFFIX}'
+            try:
+                os.rename(path, claimed_path)
+            except OSError:
+                continue
+            with open(claimed_path, 'ab') as file:  # waits for a write in progress to finish.
+                lock_file(file)
+                unlock_file(file)
+            claimed_paths.append(claimed_path)
+        return claimed_paths
+
+    @staticmethod
+    def release_segments(claimed_paths):
+        for path in claimed_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def get_spool():
+    global _spool
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                _spool = Spool()
+    return _spool
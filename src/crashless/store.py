@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+from crashless.cts import (STORE_PATH, STORE_MAX_FIXES, FIX_CACHE_TTL, STORE_CLAIM_TTL, STORE_DEDUPE_TTL,
+                           STORE_RETRY_INTERVAL)
+from crashless.metrics import metrics
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS fixes (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL,
+                                  used_at REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS fixes_used_at ON fixes (used_at);
+CREATE TABLE IF NOT EXISTS claims (fingerprint TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS claims_expires_at ON claims (expires_at);
+'''
+
+
+class SQLiteStore:
+    """
+    Store shared by all the processes of a deployment, on a SQLite file in WAL mode. Holds claims, so only one
+    process analyzes a crash and the others skip it for a while after, and cached fixes, so it can back a FixCache.
+    Fixes are bounded to max_fixes, the least recently used are evicted.
+    """
+
+    def __init__(self, path=STORE_PATH, max_fixes=STORE_MAX_FIXES, ttl=FIX_CACHE_TTL, claim_ttl=STORE_CLAIM_TTL,
+                 dedupe_ttl=STORE_DEDUPE_TTL):
+        self.path = path
+        self.max_fixes = max_fixes
+        self.ttl = ttl
+        self.claim_ttl = claim_ttl
+        self.dedupe_ttl = dedupe_ttl
+        self.local = threading.local()  # connections can't be shared between threads.
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.get_connection().executescript(SCHEMA)
+
+    def get_connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():  # forked processes open their own.
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def claim(self, fingerprint):
+        """
+        Returns the owner of the claim when the caller gets to analyze the crash: nobody is analyzing it, nor did it
+        recently. Returns None otherwise.
+        """
+        now = time.time()
+        owner = uuid.uuid4().hex
+        connection = self.get_connection()
+        connection.execute('BEGIN IMMEDIATE')  # one writer at a time, so two processes can't both claim it.
+        try:
+            connection.execute('DELETE FROM claims WHERE expires_at < ?', (now,))
+            is_claimed = connection.execute('SELECT 1 FROM claims WHERE fingerprint = ?', (fingerprint,)).fetchone()
+            if not is_claimed:
+                connection.execute('INSERT INTO claims (fingerprint, owner, expires_at) VALUES (?, ?, ?)',
+                                   (fingerprint, owner, now + self.claim_ttl))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        metrics.increment('store_claims_denied' if is_claimed else 'store_claims')
+        return None if is_claimed else owner
+
+    def release(self, fingerprint, owner, is_done=True):
+        """When done, other processes skip the crash for dedupe_ttl, otherwise any of them can analyze it again."""
+        connection = self.get_connection()
+        if is_done:
+            connection.execute('UPDATE claims SET expires_at = ? WHERE fingerprint = ? AND owner = ?',
+                               (time.time() + self.dedupe_ttl, fingerprint, owner))
+        else:
+            connection.execute('DELETE FROM claims WHERE fingerprint = ? AND owner = ?', (fingerprint, owner))
+
+    def get(self, key):
+        now = time.time()
+        connection = self.get_connection()
+        row = connection.execute('SELECT value, created_at FROM fixes WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if now - created_at > self.ttl:
+            self.delete(key)
+            return None
+        connection.execute('UPDATE fixes SET used_at = ? WHERE key = ?', (now, key))
+        return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        connection = self.get_connection()
+        connection.execute('INSERT OR REPLACE INTO fixes (key, value, created_at, used_at) VALUES (?, ?, ?, ?)',
+                           (key, json.dumps(value), now, now))
+        self.evict(now)
+
+    def delete(self, key):
+        self.get_connection().execute('DELETE FROM fixes WHERE key = ?', (key,))
+
+    def evict(self, now):
+        """Expired fixes, and the least recently used past max_fixes."""
+        connection = self.get_connection()
+        connection.execute('DELETE FROM fixes WHERE created_at < ?', (now - self.ttl,))
+        evicted = connection.execute('DELETE FROM fixes WHERE key IN (SELECT key FROM fixes ORDER BY used_at DESC '
+                                     'LIMIT -1 OFFSET ?)', (self.max_fixes,)).rowcount
+        if evicted > 0:
+            metrics.increment('store_evicted', evicted)
+
+    def close(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+
+_store = None
+_store_lock = threading.Lock()
+_store_retry_at = 0  # monotonic time of the next attempt to open it, after a failed one.
+_store_error = None
+
+
+def get_store():
+    """
+    The shared store, None when CRASHLESS_STORE_PATH isn't set. When it can't be opened it's tried again every retry
+    interval, not on every crash, and the error is only printed when it changes.
+    """
+    global _store, _store_retry_at, _store_error
+    if _store is None and STORE_PATH and time.monotonic() >= _store_retry_at:
+        with _store_lock:
+            if _store is None and time.monotonic() >= _store_retry_at:
+                try:
+                    _store = SQLiteStore(STORE_PATH)
+                except (sqlite3.Error, OSError) as error:  # processes work on their own until it can be opened.
+                    _store_retry_at = time.monotonic() + STORE_RETRY_INTERVAL
+                    metrics.increment('store_open_errors')
+                    if str(error) != _store_error:
+                        print(f'Crashless could not open the store at {STORE_PATH}: {error}')
+                    _store_error = str(error)
+    return _store
@@ -0,0 +1,217 @@
+import os
+import ast
+import sys
+import time
+import types
+import inspect
+import threading
+import importlib.util
+from types import ModuleType
+
+from crashless.cts import SYMBOL_INDEX_CHECK_INTERVAL
+from crashless.metrics import metrics
+
+
+def path_is_in_user_code(file_path):
+    not_in_packages = "site-packages" not in file_path and "lib/python" not in file_path
+    in_project_dir = os.getcwd() in file_path
+    return not_in_packages and in_project_dir
+
+
+def is_user_module(module):
+    """User defined no builtin or third party module"""
+    if module is None:
+        return False
+    if not hasattr(module, '__file__') or module.__file__ is None:
+        return False
+
+    return path_is_in_user_code(module.__file__) and module.__name__ != '__builtins__'
+
+
+class ImportTable(ast.NodeVisitor):
+    """
+    Names a module binds to the qualified names they refer to, from its AST: `import a.b as c` binds c to a.b,
+    `from .b import f as g` binds g to package.b.f and `def f` binds f to module.f. Imports inside functions only
+    bind the names no module level statement binds.
+    """
+
+    def __init__(self, module_name, package):
+        self.module_name = module_name
+        self.package = package
+        self.names = dict()
+        self.function_names = dict()  # bound by imports inside functions.
+        self.star_modules = []
+        self.depth = 0
+
+    def build(self, tree):
+        self.visit(tree)
+        self.names = {**self.function_names, **self.names}
+        self.function_names = dict()
+        return self
+
+    def bind(self, name, qualified_name):
+        names = self.names if self.depth == 0 else self.function_names
+        names[name] = qualified_name
+
+    def get_base_module_name(self, node):
+        if not node.level:
+            return node.module
+        try:
+            return importlib.util.resolve_name('.' * node.level + (node.module or ''), self.package)
+        except (ImportError, ValueError):  # relative import out of a package.
+            return None
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            if alias.asname:
+                self.bind(alias.asname, alias.name)
+            else:  # import a.b binds a.
+                top_name = alias.name.split('.')[0]
+                self.bind(top_name, top_name)
+
+    def visit_ImportFrom(self, node):
+        base_module_name = self.get_base_module_name(node)
+        if base_module_name is None:
+            return
+        for alias in node.names:
+            if alias.name == '*':
+                self.star_modules.append(base_module_name)
+            else:
+                self.bind(alias.asname or alias.name, f'{base_module_name}.{alias.name}')
+
+    def _visit_definition(self, node):
+        if self.depth == 0:  # nested ones aren't attributes of the module.
+            self.bind(node.name, f'{self.module_name}.{node.name}')
+        self.depth += 1
+        self.generic_visit(node)
+        self.depth -= 1
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _visit_definition
+
+
+def get_import_table(module):
+    """Parsed apart from the source cache, the table is kept as long as the module's file doesn't change."""
+    import_table = ImportTable(module.__name__, getattr(module, '__package__', None))
+    try:
+        with open(module.__file__, 'rb') as file, metrics.span('parsing'):
+            return import_table.build(ast.parse(file.read()))
+    except (OSError, SyntaxError, ValueError):  # no readable source, nothing is bound.
+        return import_table
+
+
+def get_module_version(module):
+    try:
+        stat = os.stat(module.__file__)
+    except (OSError, TypeError):
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_attribute(obj, name):
+    """Attributes of modules and classes only, getting others could run user code."""
+    if not isinstance(obj, ModuleType) and not inspect.isclass(obj):
+        return None
+    attribute = getattr(obj, name, None)
+    return attribute.__func__ if inspect.ismethod(attribute) else attribute  # ie: class methods.
+
+
+def split_module_name(qualified_name):
+    """Longest imported module the name starts with, and the attributes after it: a.b.f -> module a.b, ['f']"""
+    parts = qualified_name.split('.')
+    for idx in range(len(parts), 0, -1):
+        module = sys.modules.get('.'.join(parts[:idx]))
+        if module is not None:
+            return module, parts[idx:]
+    return None, parts
+
+
+class ModuleSymbols:
+    __slots__ = ('module', 'version', 'import_table')
+
+    def __init__(self, module):
+        self.module = module
+        self.version = get_module_version(module)
+        self.import_table = get_import_table(module)
+
+    def is_stale(self):
+        is_replaced = sys.modules.get(self.module.__name__) is not self.module
+        return is_replaced or get_module_version(self.module) != self.version
+
+
+class SymbolIndex:
+    """
+    Process wide index of the import tables of user modules, to resolve a called name to the exact function it calls.
+    Tables are built once per module and only built again when the module is replaced or its file changes. Resolved
+    names are kept until a module is imported or changes, so a crash resolves its calls without walking any module.
+    """
+
+    def __init__(self, check_interval=SYMBOL_INDEX_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.modules = dict()  # module name -> ModuleSymbols
+        self.resolved = dict()  # (module name, called name) -> function or None
+        self.modules_count = len(sys.modules)
+        self.last_check = time.monotonic()
+        self.lock = threading.Lock()
+
+    def resolve(self, module_name, called_name):
+        """The user defined function a call in the module refers to, ie: module.function or an imported alias."""
+        with self.lock:
+            self._refresh()
+            key = (module_name, called_name)
+            if key not in self.resolved:
+                with metrics.span('symbol_indexing'):
+                    self.resolved[key] = self._resolve(f'{module_name}.{called_name}', visited_names=set())
+            return self.resolved[key]
+
+    def _refresh(self):
+        if len(sys.modules) != self.modules_count:  # modules imported since, may resolve names that didn't.
+            self.modules_count = len(sys.modules)
+            self.resolved.clear()
+            return
+
+        now = time.monotonic()
+        if now - self.last_check < self.check_interval:
+            return
+
+        self.last_check = now
+        stale_module_names = [name for name, module_symbols in self.modules.items() if module_symbols.is_stale()]
+        for module_name in stale_module_names:
+            self.modules.pop(module_name)
+        if stale_module_names:
+            self.resolved.clear()
+
+    def _get_module_symbols(self, module):
+        module_symbols = self.modules.get(module.__name__)
+        if module_symbols is None or module_symbols.module is not module:
+            module_symbols = ModuleSymbols(module)
+            self.modules[module.__name__] = module_symbols
+        return module_symbols
+
+    def _resolve(self, qualified_name, visited_names):
+        """Follows the import tables through aliases and re-exports, ie: package.f -> package.module.f"""
+        if qualified_name in visited_names:  # circular imports.
+            return None
+        visited_names.add(qualified_name)
+
+        module, attributes = split_module_name(qualified_name)
+        if not attributes or not is_user_module(module):
+            return None
+
+        import_table = self._get_module_symbols(module).import_table
+        target_name = import_table.names.get(attributes[0])
+        if target_name is None:
+            for star_module_name in import_table.star_modules:
+                func = self._resolve('.'.join([star_module_name, *attributes]), visited_names)
+                if func is not None:
+                    return func
+        elif target_name != f'{module.__name__}.{attributes[0]}':  # imported, resolved where it comes from.
+            return self._resolve('.'.join([target_name, *attributes[1:]]), visited_names)
+
+        obj = module
+        for attribute in attributes:
+            obj = get_attribute(obj, attribute)
+        is_function = isinstance(obj, types.FunctionType)
+        return obj if is_function and path_is_in_user_code(inspect.getfile(obj)) else None
+
+
+symbol_index = SymbolIndex()
@@ -0,0 +1,205 @@
+import time
+import threading
+import traceback
+from collections import deque
+
+from crashless.cts import (ANALYSIS_WORKERS, ANALYSIS_QUEUE_SIZE, ANALYSIS_OVERFLOW_POLICY, ANALYSIS_DELAY,
+                           ASYNC_ANALYSIS_WORKERS)
+from crashless.metrics import metrics
+
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+OVERFLOW_POLICIES = (DROP_NEWEST, DROP_OLDEST, COALESCE)
+
+# Outcomes of a submit
+QUEUED = 'queued'
+DROPPED = 'dropped'
+COALESCED = 'coalesced'
+
+
+class QueueItem:
+    __slots__ = ('fingerprint', 'args', 'not_before')
+
+    def __init__(self, fingerprint, args, not_before):
+        self.fingerprint = fingerprint
+        self.args = args
+        self.not_before = not_before
+
+
+class AnalysisPool:
+    """
+    Fixed number of worker threads consuming a bounded queue, so a crash storm can't exhaust threads or memory.
+    When the queue is full the overflow policy decides what is lost: the new item (drop_newest), the item that waited
+    the most (drop_oldest), or with coalesce, items whose fingerprint is already waiting are merged into it and the
+    new item is dropped if the queue is still full.
+    """
+
+    def __init__(self, function, workers=ANALYSIS_WORKERS, max_queue_size=ANALYSIS_QUEUE_SIZE,
+                 overflow_policy=ANALYSIS_OVERFLOW_POLICY, delay=ANALYSIS_DELAY):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f'Unknown {overflow_policy=}, choose one of {OVERFLOW_POLICIES}')
+
+        self.function = function
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.delay = delay
+        self.queue = deque()
+        self.queued_fingerprints = dict()  # fingerprint -> number of items waiting with it.
+        self.condition = threading.Condition()
+        self.threads = []
+
+        # Counters
+        self.queued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.processed = 0
+        self.failed = 0
+
+    def submit(self, fingerprint, *args):
+        """Returns True if the item will be processed."""
+        with self.condition:
+            dropped = self.dropped
+            outcome = self._enqueue(fingerprint, args)
+            dropped = self.dropped - dropped  # drop_oldest can drop an item and queue the new one.
+            queue_depth = len(self.queue)
+
+        metrics.increment(f'crashes_{outcome}')
+        if dropped and outcome == QUEUED:
+            metrics.increment(f'crashes_{DROPPED}', dropped)
+        metrics.set_gauge('analysis_queue_depth', queue_depth)
+        return outcome == QUEUED
+
+    def _enqueue(self, fingerprint, args):
+        self._start_workers()
+
+        if self.overflow_policy == COALESCE and fingerprint in self.queued_fingerprints:
+            self.coalesced += 1
+            return COALESCED
+
+        if len(self.queue) >= self.max_queue_size:
+            self.dropped += 1
+            if self.overflow_policy != DROP_OLDEST or not self.queue:
+                return DROPPED
+            self._forget(self.queue.popleft())
+
+        self.queue.append(QueueItem(fingerprint, args, time.monotonic() + self.delay))
+        self.queued_fingerprints[fingerprint] = self.queued_fingerprints.get(fingerprint, 0) + 1
+        self.queued += 1
+        self._notify()
+        return QUEUED
+
+    def _notify(self):
+        self.condition.notify()
+
+    def _forget(self, item):
+        count = self.queued_fingerprints.pop(item.fingerprint, 0) - 1
+        if count > 0:
+            self.queued_fingerprints[item.fingerprint] = count
+
+    def _start_workers(self):
+        """Threads are only created on the first crash."""
+        while len(self.threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f'crashless-worker-{len(self.threads)}', daemon=True)
+            self.threads.append(thread)
+            thread.start()
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                item = self.queue.popleft()
+                self._forget(item)
+
+            wait_time = item.not_before - time.monotonic()
+            if wait_time > 0:
+                time.sleep(wait_time)
+
+            try:
+                self.function(*item.args)
+            except Exception:
+                traceback.print_exc()
+                metrics.increment('crashes_failed')
+                with self.condition:
+                    self.failed += 1
+            finally:
+                item = None  # releases the arguments, before blocking on the queue again.
+
+            with self.condition:
+                self.processed += 1
+                queue_depth = len(self.queue)
+            metrics.increment('crashes_processed')
+            metrics.set_gauge('analysis_queue_depth', queue_depth)
+
+    def get_queue_depth(self):
+        with self.condition:
+            return len(self.queue)
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                'queue_depth': len(self.queue),
+                'queued': self.queued,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'processed': self.processed,
+                'failed': self.failed,
+            }
+
+
+class AsyncAnalysisPool(AnalysisPool):
+    """
+    Same queue and overflow policies, consumed by a fixed number of tasks on the event loop of the first submit, for
+    coroutine functions. Must be submitted to from that loop.
+    """
+
+    def __init__(self, function, workers=ASYNC_ANALYSIS_WORKERS, **kwargs):
+        super().__init__(function, workers=workers, **kwargs)
+        self.loop = None
+        self.has_items = None
+
+    def _start_workers(self):
+        import asyncio  # only async apps use this pool, and they have already imported asyncio.
+
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:  # tasks of a closed loop won't run again.
+            self.loop = loop
+            self.has_items = asyncio.Event()
+            self.threads = [loop.create_task(self._work()) for _ in range(self.workers)]
+
+    def _notify(self):
+        self.has_items.set()
+
+    async def _work(self):
+        import asyncio
+
+        while True:
+            while not self.queue:
+                self.has_items.clear()
+                await self.has_items.wait()
+
+            with self.condition:
+                item = self.queue.popleft()
+                self._forget(item)
+
+            wait_time = item.not_before - time.monotonic()
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+
+            try:
+                await self.function(*item.args)
+            except Exception:
+                traceback.print_exc()
+                metrics.increment('crashes_failed')
+                with self.condition:
+                    self.failed += 1
+            finally:
+                item = None  # releases the arguments, before waiting on the queue again.
+
+            with self.condition:
+                self.processed += 1
+                queue_depth = len(self.queue)
+            metrics.increment('crashes_processed')
+            metrics.set_gauge('analysis_queue_depth', queue_depth)
@@ -0,0 +1,42 @@
+import threading
+
+from crashless.workers import AnalysisPool, DROP_NEWEST, DROP_OLDEST, COALESCE
+
+
+def fill_pool(overflow_policy, release, processed):
+    """One item is taken by the only worker, 2 wait on the queue, the rest overflow."""
+    def blocking_function(value):
+        release.wait()
+        processed.append(value)
+
+    pool = AnalysisPool(function=blocking_function, workers=1, max_queue_size=2, overflow_policy=overflow_policy,
+                        delay=0)
+    pool.submit('busy', 'busy')
+    while pool.get_queue_depth():  # waits for the worker to take it
+        pass
+    for idx in range(5):
+        pool.submit(f'fingerprint_{idx % 2}', idx)
+    return pool
+
+
+release = threading.Event()
+
+pool = fill_pool(DROP_NEWEST, release, [])
+assert [item.args[0] for item in pool.queue] == [0, 1]
+assert pool.get_stats()['dropped'] == 3
+
+pool = fill_pool(DROP_OLDEST, release, [])
+assert [item.args[0] for item in pool.queue] == [3, 4]
+assert pool.get_stats()['dropped'] == 3
+
+processed = []
+pool = fill_pool(COALESCE, release, processed)
+assert [item.args[0] for item in pool.queue] == [0, 1]
+assert pool.get_stats()['coalesced'] == 3 and pool.get_stats()['dropped'] == 0
+
+# Only the fixed number of workers is ever created.
+assert len(pool.threads) == 1
+release.set()
+while pool.get_stats()['processed'] < 3:
+    pass
+assert processed == ['busy', 0, 1]
@@ -0,0 +1,65 @@
+import asyncio
+
+from crashless import client, capture
+from crashless.workers import AsyncAnalysisPool, COALESCE
+from tests.stand_in_backend import StandInBackend
+
+
+async def check_pool():
+    release = asyncio.Event()
+    running = []
+    processed = []
+
+    async def blocking_function(value):
+        running.append(value)
+        await release.wait()
+        processed.append(value)
+
+    pool = AsyncAnalysisPool(function=blocking_function, workers=2, max_queue_size=2, overflow_policy=COALESCE,
+                             delay=0)
+    for idx in range(6):  # 2 are queued, 2 don't fit and 2 are merged into the equal crash waiting.
+        pool.submit(f'fingerprint_{idx % 4}', idx)
+    assert pool.get_stats()['dropped'] == 2 and pool.get_stats()['coalesced'] == 2
+
+    # The loop keeps running while the analyses wait, and only the fixed number of tasks run them.
+    ticks = 0
+    while len(running) < 2:
+        await asyncio.sleep(0)
+        ticks += 1
+    assert ticks > 0 and len(pool.threads) == 2
+    assert running == [0, 1]
+
+    pool.submit('fingerprint_6', 6)  # waits for a task to be free.
+    await asyncio.sleep(0.01)
+    assert running == [0, 1] and pool.get_queue_depth() == 1
+
+    release.set()
+    while pool.get_stats()['processed'] < 3:
+        await asyncio.sleep(0.01)
+    assert sorted(processed) == [0, 1, 6]
+
+
+def crash(organization):
+    return organization['employees']
+
+
+async def check_pipeline():
+    """A crash on the loop is analyzed by a task of that loop, and its fix is asked once."""
+    for processed in range(1, 3):
+        try:
+            crash(organization=None)
+        except TypeError as exc:
+            assert capture.submit_exception_async(exc)
+        while capture.async_analysis_pool.get_stats()['processed'] < processed:
+            await asyncio.sleep(0.01)
+    assert capture.async_analysis_pool.get_stats()['failed'] == 0
+
+
+asyncio.run(check_pool())
+
+backend = StandInBackend().start()
+client.backend_client.base_url = backend.url
+asyncio.run(check_pipeline())
+assert backend.requests == 1  # the second crash got its fix from the cache.
+assert backend.bodies[-1]['environments'][-1]['file_path'] == __file__
+backend.stop()
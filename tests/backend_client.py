@@ -0,0 +1,58 @@
+import json
+
+import requests
+
+from crashless.client import BackendClient
+from tests.stand_in_backend import StandInBackend
+
+backend = StandInBackend().start()
+client = BackendClient(base_url=backend.url, read_timeout=5, max_retries=2)
+big_data = json.dumps({'code': 'x = 1\n' * 1000})
+
+# Bodies are plain while the backend doesn't advertise compression, and the connection is reused.
+first = client.post('/crashless/get-crash-fix', big_data)
+second = client.post('/crashless/get-crash-fix', big_data)
+assert first.status_code == 200 and backend.bodies[-1] == json.loads(big_data)
+assert list(backend.encodings) == [None, None]
+assert first.json()['connection_port'] == second.json()['connection_port']
+
+# Once advertised, bodies are compressed.
+backend.takes_gzip = backend.advertises_gzip = True
+assert client.post('/crashless/get-crash-fix', big_data).status_code == 200
+assert client.post('/crashless/get-crash-fix', big_data).status_code == 200
+assert list(backend.encodings)[-2:] == [None, 'gzip'] and backend.bodies[-1] == json.loads(big_data)
+
+# Other client errors, ie: a 403, keep bodies compressed.
+backend.status_codes['/forbidden'] = 403
+assert client.post('/forbidden', big_data).status_code == 403
+assert backend.encodings[-1] == 'gzip' and client.compression == 'gzip'
+
+# Transient errors are retried, all the attempts with the same idempotency key.
+backend.failures_left['/retried'] = 2
+assert client.post('/retried', '{}').status_code == 200
+idempotency_keys = list(backend.idempotency_keys)
+assert len(set(idempotency_keys[-3:])) == 1 and idempotency_keys[-1] != idempotency_keys[-4]
+
+# Read timeouts aren't, the backend could be computing the fix.
+backend.latency = 0.5
+requests_before = backend.requests
+try:
+    BackendClient(base_url=backend.url, read_timeout=0.1, max_retries=2).post('/crashless/get-crash-fix', '{}')
+    assert False, 'Should time out'
+except requests.ReadTimeout:
+    pass
+assert backend.requests == requests_before + 1
+backend.latency = 0
+
+# Retries are bounded.
+backend.failures_left['/always-failing'] = 10
+assert client.post('/always-failing', '{}').status_code == 503
+assert backend.failures_left['/always-failing'] == 7
+
+# Falls back to plain bodies, when the backend can't decode compressed ones.
+backend.takes_gzip = False
+assert client.post('/crashless/get-crash-fix', big_data).status_code == 200
+assert list(backend.encodings)[-2:] == ['gzip', None]
+assert client.compression is None
+
+backend.stop()
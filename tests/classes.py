@@ -0,0 +1,90 @@
+from typing import List, Optional
+
+from crashless.snapshot import take_snapshot
+from crashless.handler import get_environments_and_defs
+from crashless.classes import get_class_outline
+
+
+class Address:
+    city: str
+
+    def get_city(self):
+        return self.city
+
+    def un_used_address_method(self):
+        pass
+
+
+class ModelMeta(type):
+    pass
+
+
+class Model(metaclass=ModelMeta):
+    """Base of the models."""
+    table = None
+
+    def save(self):
+        return self.validate()
+
+    def validate(self):
+        return True
+
+    def un_used_model_method(self):
+        pass
+
+
+class Employee(Model):
+    table = 'employees'
+    address: Optional['Address']
+    managers: List['Employee']
+
+    def __init__(self, name):
+        self.name = name
+        self.address = None
+
+    @property
+    def display_name(self):
+        return self.name.title()
+
+    def save(self):
+        return super().save()
+
+    def un_used_method(self):
+        pass
+
+    audited: bool = True  # declared after the methods.
+
+
+def crash(employee):
+    employee.save()
+    return employee.display_name + employee.address.get_city()
+
+
+try:
+    crash(Employee('pedro'))
+except AttributeError as exc:
+    _, definitions = get_environments_and_defs(take_snapshot(exc))
+
+# Headers of the class, of its bases and of the classes of its fields.
+assert {'__main__.Employee', '__main__.Model', '__main__.Address'} <= set(definitions)
+assert "address: Optional['Address']" in definitions['__main__.Employee'].code
+assert 'def ' not in definitions['__main__.Employee'].code
+assert '"""Base of the models."""' in definitions['__main__.Model'].code
+assert definitions['__main__.Model'].code.startswith('class Model(metaclass=ModelMeta):')
+assert definitions['__main__.Employee.audited'].code == '    audited: bool = True  # declared after the methods.'
+
+# Only the methods used, following the MRO and the calls of the methods themselves.
+assert {'__main__.Employee.__init__', '__main__.Employee.display_name', '__main__.Employee.save',
+        '__main__.Model.save', '__main__.Model.validate', '__main__.Address.get_city'} <= set(definitions)
+assert not [name for name in definitions if 'un_used' in name]
+assert definitions['__main__.Employee.display_name'].code.startswith('    @property')  # with its decorators.
+
+# Exact line ranges, so fixes can be patched back.
+with open(__file__) as file:
+    file_lines = file.read().split('\n')
+for definition in definitions.values():
+    lines = file_lines[definition.start_scope_index:definition.end_scope_index + 1]
+    assert definition.code == '\n'.join(lines), definition.name
+
+# Outlines are computed once per class.
+assert get_class_outline(Employee) is get_class_outline(Employee)
@@ -0,0 +1,59 @@
+import asyncio
+
+from crashless import blobs
+from crashless.client import BackendClient, AsyncBackendClient
+from tests.stand_in_backend import StandInBackend
+
+
+class NotJsonResponse:
+    status_code = 200
+
+    def json(self):
+        raise ValueError('Expecting value')
+
+
+class NotJsonClient:
+    def post(self, path, data, headers=None):
+        return NotJsonResponse()
+
+
+payload = {
+    'packages': ['requests==2.0.0', 'fastapi==0.83.0'],
+    'stacktrace_str': 'Traceback...',
+    'environments': [{'index': 1, 'code': 'b()'}, {'index': 0, 'code': 'a()'}],
+    'additional_definitions': {'b': {'index': 3, 'code': 'def b(): pass'}, 'a': {'index': 2, 'code': 'def a(): b()'}},
+}
+
+# The same payload always gives the same canonical json, no matter the order.
+reordered_payload = {**payload, 'environments': payload['environments'][::-1],
+                     'packages': payload['packages'][::-1]}
+assert blobs.dumps(blobs.get_content_addressed_payload(payload)[0]) == \
+       blobs.dumps(blobs.get_content_addressed_payload(reordered_payload)[0])
+
+backend = StandInBackend().start()
+client = BackendClient(base_url=backend.url, max_retries=0)
+
+# Code is sent only the first time.
+response = blobs.send_payload(client, payload, headers={})
+assert response.json()['explanation'] == 'a() b()'
+assert len(backend.received_blobs[-1]) == 4
+blobs.send_payload(client, payload, headers={})
+assert backend.received_blobs[-1] == {}
+
+# The async sender follows the same protocol.
+async_client = AsyncBackendClient(sync_client=client)
+response = asyncio.run(blobs.send_payload_async(async_client, payload, headers={}))
+assert response.json()['explanation'] == 'a() b()' and backend.received_blobs[-1] == {}
+
+# Answers that can't be used get the full payload, and the protocol is tried again on the next crash.
+backend.failures_left[blobs.MISSING_BLOBS_PATH] = 1
+assert blobs.send_payload(client, payload, headers={}) is None
+assert blobs.send_payload(NotJsonClient(), payload, headers={}) is None
+assert blobs.is_supported()
+
+# Backends without the protocol get the full payload.
+backend.supports_blobs = False
+assert blobs.send_payload(client, payload, headers={}) is None
+assert not blobs.is_supported()
+
+backend.stop()
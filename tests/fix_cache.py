@@ -0,0 +1,34 @@
+import time
+import tempfile
+
+from crashless.cache import FixCache, DirectoryStore, get_crash_fingerprint, get_fix_fingerprint
+
+# Same crash on same code has the same fingerprint, changing the code or the line changes it.
+frames = [('/project/main.py', 'crash', 10), ('/project/main.py', 'sum_ages', 4)]
+crash_fingerprint = get_crash_fingerprint('builtins.TypeError', frames)
+assert crash_fingerprint == get_crash_fingerprint('builtins.TypeError', list(frames))
+assert crash_fingerprint != get_crash_fingerprint('builtins.ValueError', frames)
+assert crash_fingerprint != get_crash_fingerprint('builtins.TypeError', frames[:1] + [('/project/main.py', 'sum_ages', 5)])
+assert get_fix_fingerprint(crash_fingerprint, ['a = 1']) != get_fix_fingerprint(crash_fingerprint, ['a = 2'])
+
+# Least recently used entries are evicted.
+cache = FixCache(max_size=2, ttl=60)
+cache.set('a', {'explanation': 'a'})
+cache.set('b', {'explanation': 'b'})
+assert cache.get('a') == {'explanation': 'a'}
+cache.set('c', {'explanation': 'c'})
+assert cache.get('b') is None
+assert cache.get('a') is not None and cache.get('c') is not None
+
+# Entries expire.
+cache = FixCache(max_size=2, ttl=0.01)
+cache.set('a', {'explanation': 'a'})
+time.sleep(0.02)
+assert cache.get('a') is None
+
+# Entries survive on disk, when the memory is empty.
+with tempfile.TemporaryDirectory() as cache_dir:
+    FixCache(backing_store=DirectoryStore(cache_dir)).set('a', {'explanation': 'a'})
+    new_process_cache = FixCache(backing_store=DirectoryStore(cache_dir))
+    assert new_process_cache.get('a') == {'explanation': 'a'}
+    assert new_process_cache.hits == 1
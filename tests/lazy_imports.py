@@ -0,0 +1,24 @@
+import os
+import sys
+import json
+import subprocess
+
+# The handlers only import what captures a crash, the analysis, network and UI are imported on the first crash.
+HEAVY_MODULES = ['crashless.handler', 'crashless.client', 'crashless.sources', 'crashless.patches',
+                 'crashless.packages', 'halo', 'requests', 'difflib']
+CODE = '''
+import sys, json
+import fastapi.responses, starlette.requests
+before = set(sys.modules)
+import crashless.fastapi_handler
+from crashless import capture
+imported = sorted(set(sys.modules) - before)
+capture.prewarm().join()
+print(json.dumps({'imported': imported, 'prewarmed': 'crashless.handler' in sys.modules}))
+'''
+
+env = {**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)}
+output = subprocess.run([sys.executable, '-c', CODE], env=env, capture_output=True, text=True, check=True).stdout
+result = json.loads(output)
+assert not set(HEAVY_MODULES) & set(result['imported']), set(HEAVY_MODULES) & set(result['imported'])
+assert result['prewarmed']
@@ -16,3 +16,11 @@ def call_in_f_string():
 
 def un_used_method():
     pass
+
+
+def function_imported_with_alias():
+    pass
+
+
+def function_called_through_module_alias():
+    pass
@@ -1,38 +1,50 @@
 from sample_code import my_scope
-from crashless.handler import get_environments_and_defs, get_function_call_matches, get_function_regexes
+from crashless.snapshot import take_snapshot
+from crashless.handler import get_environments_and_defs
+from crashless.sources import get_called_names
 
-functions_dict = {'my_function': 'anything'}
-single_regex, double_regex = get_function_regexes(functions_dict)
-
-assert get_function_call_matches('     my_function()', single_regex=single_regex, double_regex=double_regex)
-assert get_function_call_matches('my_function()', single_regex=single_regex, double_regex=double_regex)
-assert not get_function_call_matches('     # my_function()', single_regex=single_regex, double_regex=double_regex)
-assert not get_function_call_matches('     my_function', single_regex=single_regex, double_regex=double_regex)  # Missing parentheses
-assert not get_function_call_matches('def my_function():', single_regex=single_regex, double_regex=double_regex)  # Function definition
-assert not get_function_call_matches('""" my_function() """', single_regex=single_regex, double_regex=double_regex)  # Inside multiline comment
-assert get_function_call_matches('\t\tmy_function()', single_regex=single_regex, double_regex=double_regex)  # Matches with tabs
-assert get_function_call_matches('if my_function() else x', single_regex=single_regex, double_regex=double_regex)
-assert get_function_call_matches('my_function(a, b, c="asd") # sometinh', single_regex=single_regex, double_regex=double_regex)
-assert not get_function_call_matches(" somethin #   common.my_function()", single_regex=single_regex, double_regex=double_regex)
-assert get_function_call_matches("    candidate_queryset = common.my_function(", single_regex=single_regex, double_regex=double_regex)
-
-# TODO: missing f string case.
-#assert line_has_function_call("print(f'some text={function_call()}", single_regex=single_regex, double_regex=double_regex)
+assert 'my_function' in get_called_names('     my_function()')
+assert 'my_function' in get_called_names('my_function()')
+assert 'my_function' not in get_called_names('     # my_function()')
+assert 'my_function' not in get_called_names('     my_function')  # Missing parentheses
+assert 'my_function' not in get_called_names('def my_function():\n    pass')  # Function definition
+assert 'my_function' not in get_called_names('""" my_function() """')  # Inside multiline comment
+assert 'my_function' in get_called_names('\t\tmy_function()')  # Matches with tabs
+assert 'my_function' in get_called_names('y = my_function() if z else x')
+assert 'my_function' in get_called_names('my_function(a, b, c="asd") # sometinh')
+assert 'common.my_function' not in get_called_names(" somethin #   common.my_function()")
+assert 'common.my_function' in get_called_names("candidate_queryset = common.my_function(\n    a,\n)")  # Multiline
+assert 'my_function' not in get_called_names("print('my_function()')")  # Inside string
+assert 'function_call' in get_called_names("print(f'some text={function_call()}')")  # f-string
 
 # Test that method definitions are retrieved
 try:
     my_scope()
 except Exception as exc:
-    environments, _ = get_environments_and_defs(exc)
+    environments, definitions = get_environments_and_defs(take_snapshot(exc))
     sample_environment = environments[1]
 
-    assert 'my_local_function1' in sample_environment.used_additional_definitions
-    assert 'my_local_function2' in sample_environment.used_additional_definitions
-    assert 'my_local_function3' in sample_environment.used_additional_definitions
-    assert 'function_called_directly' in sample_environment.used_additional_definitions
+    assert 'sample_code.my_local_function1' in sample_environment.used_additional_definitions
+    assert 'sample_code.my_local_function2' in sample_environment.used_additional_definitions
+    assert 'sample_code.my_local_function3' in sample_environment.used_additional_definitions
+    assert 'another_module.function_called_directly' in sample_environment.used_additional_definitions
     assert 'another_module.function_called_indirectly' in sample_environment.used_additional_definitions
-    assert 'un_used_method' not in sample_environment.used_additional_definitions
-    assert 'intricate_call' in sample_environment.used_additional_definitions
-    assert 'starts_with_same_string' in sample_environment.used_additional_definitions
-    assert 'starts_with_same_string_but_is_a_lot_longer' in sample_environment.used_additional_definitions
-    #assert 'call_in_f_string' in sample_environment.used_additional_definitions  # TODO: missing f-string case
+    assert 'sample_code.un_used_method' not in sample_environment.used_additional_definitions
+    assert 'another_module.intricate_call' in sample_environment.used_additional_definitions
+    assert 'sample_code.starts_with_same_string' in sample_environment.used_additional_definitions
+    assert 'sample_code.starts_with_same_string_but_is_a_lot_longer' in sample_environment.used_additional_definitions
+    assert 'another_module.call_in_f_string' in sample_environment.used_additional_definitions
+    assert 'sample_code.ping' in sample_environment.used_additional_definitions
+    assert 'sample_code.pong' in sample_environment.used_additional_definitions  # reached only through ping
+
+    # Aliases, module aliases and re-exports resolve to the exact function, named by its qualified name.
+    assert 'another_module.function_imported_with_alias' in definitions
+    assert 'another_module.function_called_through_module_alias' in definitions
+    assert definitions['reexports.implementation.reexported_function'].file_path.endswith('implementation.py')
+    assert definitions['reexports.helpers.helper']._distance == 2  # called from the re-exported function.
+    assert not [name for name in definitions if name.endswith('un_used_method')]
+
+    # Functions with the same name are all kept, each at its own distance.
+    assert definitions['same_names_a.helper']._distance == 1
+    assert definitions['same_names_a.helper'].name == 'same_names_a.helper'
+    assert definitions['same_names_b.helper']._distance == 3
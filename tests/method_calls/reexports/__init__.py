@@ -0,0 +1 @@
+from .implementation import reexported_function
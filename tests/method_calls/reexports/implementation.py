@@ -0,0 +1,5 @@
+from .helpers import helper as aliased_helper
+
+
+def reexported_function():
+    return aliased_helper() + un_used_method()  # not imported here, so it's not the one in sample_code.
@@ -0,0 +1,5 @@
+from same_names_b import run
+
+
+def helper():
+    return run()
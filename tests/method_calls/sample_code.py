@@ -1,5 +1,9 @@
 import another_module
+import another_module as aliased_module
+import reexports
 from another_module import function_called_directly, call_in_f_string, intricate_call
+from another_module import function_imported_with_alias as aliased_function
+from same_names_a import helper
 
 
 def my_local_function1(a, b):
@@ -26,6 +30,14 @@ def starts_with_same_string_but_is_a_lot_longer():
     pass
 
 
+def ping(n):
+    return pong(n - 1) if n else 0
+
+
+def pong(n):
+    return ping(n - 1) if n else 0
+
+
 def my_scope():
     my_local_function1(1, 1)
     raise Exception
@@ -41,4 +53,9 @@ def my_scope():
     if intricate_call():
         print('blah')
     print(f'{True if call_in_f_string() else False}')
+    ping(2)  # mutual recursion
+    aliased_function()
+    aliased_module.function_called_through_module_alias()
+    reexports.reexported_function()
+    helper()  # another module has a helper too.
 
@@ -0,0 +1,41 @@
+import json
+import tempfile
+
+from crashless.metrics import MetricsRegistry, COUNTER, GAUGE, TIMING
+
+registry = MetricsRegistry()
+recorded = []
+registry.add_hook(lambda kind, name, value: recorded.append((kind, name)))
+
+
+def broken_hook(kind, name, value):
+    raise ValueError('broken hook')
+
+
+registry.add_hook(broken_hook)  # doesn't stop the other hooks nor the metrics.
+registry.increment('payload_bytes', 100)
+registry.remove_hook(broken_hook)
+
+registry.increment('payload_bytes', 50)
+registry.set_gauge('analysis_queue_depth', 3)
+with registry.span('parsing'):
+    pass
+try:
+    with registry.span('parsing'):  # failed stages are also timed.
+        raise KeyError('crash')
+except KeyError:
+    pass
+
+snapshot = registry.get_snapshot()
+assert snapshot['counters'] == {'payload_bytes': 150}
+assert snapshot['gauges'] == {'analysis_queue_depth': 3}
+assert snapshot['timings']['parsing']['count'] == 2
+assert recorded == [(COUNTER, 'payload_bytes'), (COUNTER, 'payload_bytes'), (GAUGE, 'analysis_queue_depth'),
+                    (TIMING, 'parsing'), (TIMING, 'parsing')]
+
+with tempfile.NamedTemporaryFile('r', suffix='.json') as file:
+    registry.dump(file.name)
+    assert json.load(file)['counters']['payload_bytes'] == 150
+
+registry.reset()
+assert registry.get_snapshot() == {'counters': {}, 'gauges': {}, 'timings': {}}
@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+
+from crashless.packages import PackageInventory, get_top_level_name
+
+
+def install(site_dir, name, version, top_level=None, files=()):
+    """Fake installed distribution, only its metadata."""
+    dist_info = os.path.join(site_dir, f'{name}-{version}.dist-info')
+    os.makedirs(dist_info)
+    with open(os.path.join(dist_info, 'METADATA'), 'w') as file:
+        file.write(f'Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n')
+    if top_level is not None:
+        with open(os.path.join(dist_info, 'top_level.txt'), 'w') as file:
+            file.write(f'{top_level}\n')
+    with open(os.path.join(dist_info, 'RECORD'), 'w') as file:
+        file.write(''.join(f'{path},,\n' for path in files))
+    os.utime(site_dir, ns=(0, os.stat(site_dir).st_mtime_ns + 1_000_000_000))  # as if installed a second later.
+
+
+with tempfile.TemporaryDirectory() as site_dir:
+    sys.path.insert(0, site_dir)
+    install(site_dir, 'PyYAML', '6.0', top_level='yaml')
+    install(site_dir, 'pip', '24.0', top_level='pip')
+
+    # Same packages as pip freeze, pip itself is left out.
+    inventory = PackageInventory()
+    packages = inventory.get_packages()
+    assert 'PyYAML==6.0' in packages and 'pip==24.0' not in packages
+    assert packages == sorted(packages, key=str.lower)
+
+    # Computed once, until sys.path or its directories change.
+    computed_packages = inventory.packages
+    inventory.get_packages()
+    assert inventory.packages is computed_packages
+    install(site_dir, 'six', '1.16.0', files=['six.py', 'six-1.16.0.dist-info/METADATA'])
+    assert 'six==1.16.0' in inventory.get_packages() and inventory.packages is not computed_packages
+
+    # Only the packages owning files of the crash, by their importable name.
+    assert get_top_level_name(os.path.join(site_dir, 'yaml', 'loader.py')) == 'yaml'
+    assert get_top_level_name(os.path.join(site_dir, 'six.py')) == 'six'
+    relevant_paths = [os.path.join(site_dir, 'yaml', 'loader.py'), os.path.join(site_dir, 'six.py'), __file__]
+    assert inventory.get_relevant_packages(relevant_paths) == ['PyYAML==6.0', 'six==1.16.0']
+    assert inventory.get_relevant_packages([os.path.join(site_dir, 'pip', 'main.py')]) == ['pip==24.0']
+    sys.path.remove(site_dir)
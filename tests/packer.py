@@ -0,0 +1,43 @@
+from crashless.packer import pack, get_code_size
+from crashless.handler import Environment, Definition
+
+
+def get_environment(idx, distance, used_additional_definitions):
+    environment = Environment(index=idx, file_path='main.py', code='x = 1\n' * 20, start_scope_index=0,
+                              end_scope_index=19, error_code_line='x = 1', local_vars='{}', error_line_number=1,
+                              total_file_lines=20, used_additional_definitions=used_additional_definitions)
+    environment._distance = distance
+    return environment
+
+
+def get_definition(name, distance, n_lines):
+    definition = Definition(name=name, file_path='main.py', code='y = 2\n' * n_lines, start_scope_index=0,
+                            end_scope_index=n_lines - 1)
+    definition._distance = distance
+    return definition
+
+
+crashing_environment = get_environment(1, 0, ['near', 'far', 'huge'])
+caller_environment = get_environment(0, 1, [])
+definitions = {
+    'far': get_definition('far', 3, 5),
+    'huge': get_definition('huge', 1, 1000),
+    'near': get_definition('near', 1, 5),
+}
+environments = [caller_environment, crashing_environment]
+
+# With enough budget everything fits, the closest to the crash goes first.
+kept_environments, kept_definitions = pack(environments, dict(definitions), fixed_size=0, max_chars=1_000_000)
+assert kept_environments == environments
+assert list(kept_definitions) == ['huge', 'near', 'far']
+
+# What doesn't fit is skipped, but smaller things further away still use the budget.
+budget = sum(get_code_size(e) for e in environments) + get_code_size(definitions['near'], 'near') + \
+         get_code_size(definitions['far'], 'far')
+kept_environments, kept_definitions = pack(environments, dict(definitions), fixed_size=0, max_chars=budget)
+assert list(kept_definitions) == ['near', 'far']
+assert crashing_environment.used_additional_definitions == ['near', 'far']
+
+# The crashing environment is always sent.
+kept_environments, kept_definitions = pack(environments, dict(definitions), fixed_size=0, max_chars=10)
+assert kept_environments == [crashing_environment] and not kept_definitions
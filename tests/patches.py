@@ -0,0 +1,84 @@
+import os
+import tempfile
+
+from crashless.patches import get_hunks, get_patch, apply_patches, parse_patch, PatchError
+
+old_code = 'def crash():\n    result = 8 + \'7\'\n    return result\n'
+new_code = 'def crash():\n    result = 8 + int(\'7\')\n    return result\n'
+hunks = get_hunks(old_code, new_code)
+assert len(hunks) == 1
+header, body = hunks[0]
+assert header == '@@ -1,3 +1,3 @@\n'
+assert body == ' def crash():\n-    result = 8 + \'7\'\n+    result = 8 + int(\'7\')\n     return result\n'
+assert get_hunks(old_code, old_code) == []
+
+with tempfile.TemporaryDirectory() as directory:
+    def get_path(patch_path):
+        return os.path.join(directory, patch_path.lstrip('/'))
+
+    def write(name, code):
+        with open(get_path(name), 'w') as file:
+            file.write(code)
+
+    def read(name):
+        with open(get_path(name)) as file:
+            return file.read()
+
+    # Files without a newline at the end keep it that way.
+    write('main.py', old_code[:-1])
+    apply_patches([get_patch('/main.py', get_hunks(old_code[:-1], new_code[:-1]))], get_path=get_path)
+    assert read('main.py') == new_code[:-1]
+
+    # Several changes in one batch.
+    write('main.py', old_code)
+    write('other.py', 'a = 1\n')
+    patches = [get_patch('/main.py', get_hunks(old_code, new_code)),
+               get_patch('/other.py', get_hunks('a = 1\n', 'a = 2\n'))]
+    apply_patches(patches, get_path=get_path)
+    assert read('main.py') == new_code and read('other.py') == 'a = 2\n'
+
+    # If a file changed since the patch was computed nothing is applied.
+    write('main.py', old_code)
+    write('other.py', 'a = 3\n')
+    try:
+        apply_patches(patches, get_path=get_path)
+        assert False, 'Should not apply on changed files'
+    except PatchError:
+        pass
+    assert read('main.py') == old_code and read('other.py') == 'a = 3\n'
+
+    # Fixes computed on the same original file apply together, the lines added by the first one shift the second one.
+    original_code = ''.join(f'line_{idx} = {idx}\n' for idx in range(20))
+    first_code = original_code.replace('line_2 = 2\n', 'line_2 = 2\nextra_1 = 1\nextra_2 = 2\n')
+    second_code = original_code.replace('line_17 = 17', 'line_17 = 170')
+    write('batch.py', original_code)
+    apply_patches([get_patch('/batch.py', get_hunks(original_code, first_code)),
+                   get_patch('/batch.py', get_hunks(original_code, second_code))], get_path=get_path)
+    assert read('batch.py') == first_code.replace('line_17 = 17', 'line_17 = 170')
+
+    # Line ends are kept, files with \r\n aren't rewritten with \n.
+    crlf_code = old_code.replace('\n', '\r\n')
+    with open(get_path('crlf.py'), 'w', newline='') as file:
+        file.write(crlf_code)
+    apply_patches([get_patch('/crlf.py', get_hunks(crlf_code, new_code.replace('\n', '\r\n')))], get_path=get_path)
+    with open(get_path('crlf.py'), newline='') as file:
+        assert file.read() == new_code.replace('\n', '\r\n')
+
+    # Only newlines end lines, form feeds and line separators are part of them, as for git.
+    special_code = 'a = 1\n\x0c\nb = "\u2028"  # separator\nc = 3\n'
+    hunks = get_hunks(special_code, special_code.replace('c = 3', 'c = 4'))
+    assert hunks[0][0] == '@@ -1,4 +1,4 @@\n'
+    write('special.py', special_code)
+    apply_patches([get_patch('/special.py', hunks)], get_path=get_path)
+    assert read('special.py') == special_code.replace('c = 3', 'c = 4')
+
+# Each hunk takes the lines its header counts, the headers of the next file aren't part of it.
+patch = get_patch('/f1', get_hunks('a\nb\n', 'a\nc\n')) + get_patch('/f2', get_hunks('d\n', 'e\n'))
+file_hunks = parse_patch(patch)
+assert [(hunk.old_lines, hunk.new_lines) for hunk in file_hunks['/f1']] == [(['a\n', 'b\n'], ['a\n', 'c\n'])]
+assert [(hunk.old_lines, hunk.new_lines) for hunk in file_hunks['/f2']] == [(['d\n'], ['e\n'])]
+try:
+    parse_patch(patch[:-len('+e\n')])
+    assert False, 'Should not parse cut patches'
+except PatchError:
+    pass
@@ -0,0 +1,78 @@
+import json
+import time
+
+from crashless.ratelimit import CrashLimiter, TokenBucket, get_crash_key, ALLOWED, RATE_LIMITED, SAMPLED_OUT
+
+
+def crash(value):
+    return value['missing']
+
+
+def get_exception(value):
+    try:
+        crash(value)
+    except KeyError as e:
+        return e
+
+
+# Same crash, same key, even with other values. Different exception or place, different key.
+assert get_crash_key(get_exception({'a': 1})) == get_crash_key(get_exception({'b': 2}))
+assert get_crash_key(get_exception({'a': 1})) != get_crash_key(ValueError('not raised'))
+
+
+def get_json_exception(caller):
+    try:
+        caller()
+    except json.JSONDecodeError as e:
+        return e
+
+
+def load_user(text):
+    return json.loads(text)
+
+
+def load_order(text):
+    return json.loads(text)
+
+
+# Crashes inside a library are keyed by the user code calling it, the library frame only when there's no user code.
+user_exception = get_json_exception(lambda: load_user('{'))
+order_exception = get_json_exception(lambda: load_order('{'))
+assert get_crash_key(user_exception) != get_crash_key(order_exception)
+assert get_crash_key(user_exception)[1] is load_user.__code__
+assert get_crash_key(get_json_exception(lambda: load_user(''))) == get_crash_key(user_exception)
+library_exception = get_json_exception(lambda: json.loads('{'))
+while library_exception.__traceback__.tb_frame.f_code.co_filename == __file__:  # only the frames of json are left.
+    library_exception.__traceback__ = library_exception.__traceback__.tb_next
+assert get_crash_key(library_exception)[1].co_filename == json.decoder.__file__
+
+# A bucket allows a burst, then refills at its rate.
+bucket = TokenBucket(rate=10, capacity=2, now=0)
+assert [bucket.take(now=0) for _ in range(3)] == [True, True, False]
+assert bucket.take(now=0.1)
+
+# Each crash has its own limit, and all of them share the global one.
+limiter = CrashLimiter(rate_per_minute=0, burst=2, global_rate_per_minute=0, global_burst=3, sample_threshold=1000)
+assert [limiter.check('a') for _ in range(3)] == [ALLOWED, ALLOWED, RATE_LIMITED]
+assert [limiter.check('b') for _ in range(2)] == [ALLOWED, RATE_LIMITED]
+assert limiter.get_stats() == {'allowed': 3, 'rate_limited': 2, 'sampled_out': 0, 'tracked_crashes': 2}
+
+# Past the threshold only a sample is analyzed.
+limiter = CrashLimiter(rate_per_minute=60 * 1000, burst=1000, global_rate_per_minute=60 * 1000, global_burst=1000,
+                       sample_threshold=10, sample_rate=0)
+outcomes = [limiter.check('a') for _ in range(20)]
+assert outcomes == [ALLOWED] * 10 + [SAMPLED_OUT] * 10
+
+# Only the most recently seen crashes are tracked.
+limiter = CrashLimiter(max_crashes=2)
+for key in ['a', 'b', 'c']:
+    limiter.check(key)
+assert list(limiter.crashes) == ['b', 'c']
+
+# Suppressing is cheap: no frame is walked.
+limiter = CrashLimiter(rate_per_minute=0, burst=0)
+exception = get_exception({})
+start = time.perf_counter()
+for _ in range(10_000):
+    limiter.allow(get_crash_key(exception))
+assert time.perf_counter() - start < 1
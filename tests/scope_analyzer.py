@@ -0,0 +1,48 @@
+import ast
+
+from crashless.sources import ScopeAnalyzer, MODULE_SCOPE
+
+code = '''import functools
+
+TOTAL = 1
+
+
+@functools.lru_cache()
+def outer(value):
+    def inner(other):
+        return other + 1
+
+    return inner(value)
+
+
+class Employee:
+    @property
+    def name(self):
+        return 'pedro'
+'''
+analyzer = ScopeAnalyzer().analyze(ast.parse(code))
+
+
+def get_scope(line_number):
+    scope_id = analyzer.get_scope_id(line_number)
+    return analyzer.scope_names[scope_id], analyzer.get_scope_bounds(scope_id)
+
+
+# Module level lines, and the blank lines below them, belong to the module.
+assert get_scope(1) == get_scope(4) == ('Module', (1, 14))
+assert analyzer.get_scope_id(3) == MODULE_SCOPE
+assert get_scope(14) == ('Module', (1, 14))  # the class line itself, as before scopes had ids.
+
+# Decorators belong to the function they decorate, and the function holds its nested ones.
+assert get_scope(6) == get_scope(7) == ('Function: outer', (6, 11))
+assert get_scope(8) == ('Function: outer', (6, 11))  # the nested def line is taken by the scope it's in.
+assert get_scope(9) == get_scope(10) == ('Function: inner', (9, 9))
+assert get_scope(11) == get_scope(13) == ('Function: outer', (6, 11))  # back to the outer function after it.
+
+# Same for methods, whose body follows their decorator.
+assert get_scope(15) == get_scope(17) == ('Function: name', (15, 17))
+assert get_scope(16) == ('Class: Employee', (16, 16))
+
+# Scopes are ids, the lines are runs of consecutive lines with the same scope.
+assert len(analyzer.scope_names) == 5
+assert len(analyzer.run_starts) == len(analyzer.run_scope_ids) == 8
@@ -0,0 +1,69 @@
+import time
+import mmap
+
+from crashless.serializer import serialize_value, serialize_local_vars, register_summarizer, HUGE_TEXT_CHARS
+
+
+class ndarray:
+    """Looks like a numpy array, without needing numpy."""
+    __module__ = 'numpy'
+
+    shape = (1000, 1000)
+    dtype = 'float64'
+
+    def __str__(self):
+        raise AssertionError('Should not be called')
+
+
+class SlowToPrint:
+    def __str__(self):
+        time.sleep(0.2)
+        return 'slow'
+
+
+class HugeText:
+    calls = 0
+
+    def __str__(self):
+        HugeText.calls += 1
+        return 'x' * (HUGE_TEXT_CHARS + 1)
+
+
+class MyModel:
+    def __str__(self):
+        return 'MyModel id=1'
+
+
+# Values are bounded.
+assert len(serialize_value('x' * 1_000_000, max_chars=100)) <= 100
+assert len(serialize_value(list(range(1_000_000)), max_chars=100)) <= 100
+assert serialize_value(list(range(1_000_000))).startswith('<list len=1000000> [0, 1, 2')
+assert serialize_value(MyModel()) == 'MyModel id=1'
+
+# Bytes and buffers are cut before they are repr'd, the rest of them is never copied.
+big_bytes = b'\x00' * 50_000_000
+start_time = time.monotonic()
+assert serialize_value(big_bytes, max_chars=100).startswith("<bytes len=50000000> b'\\x00")
+assert serialize_value(bytearray(big_bytes), max_chars=100).startswith('<bytearray len=50000000> ')
+assert serialize_value(memoryview(big_bytes), max_chars=100).startswith("<memoryview nbytes=50000000> b'\\x00")
+assert serialize_value(mmap.mmap(-1, 50_000_000), max_chars=100).startswith("<mmap nbytes=50000000> b'\\x00")
+assert time.monotonic() - start_time < 0.1
+assert serialize_value(b'abc') == "b'abc'"
+
+# A type whose str was huge isn't asked for it again.
+assert len(serialize_value(HugeText(), max_chars=100)) == 100
+assert serialize_value(HugeText()) == f'<{__name__}.HugeText, str of {HUGE_TEXT_CHARS + 1} chars>'
+assert HugeText.calls == 1
+
+# Heavy types are summarized, without calling their __str__.
+assert serialize_value(ndarray()) == '<ndarray shape=(1000, 1000) dtype=float64>'
+assert serialize_value({'matrix': ndarray()}) == "{'matrix': <ndarray shape=(1000, 1000) dtype=float64>}"
+register_summarizer(f'{MyModel.__module__}.MyModel', lambda value: '<MyModel>')
+assert serialize_value(MyModel()) == '<MyModel>'
+
+# All the locals are bounded in chars and time.
+local_vars = {f'var_{idx}': 'x' * 1000 for idx in range(100)}
+assert len(serialize_local_vars(local_vars, max_chars_per_var=100, max_chars=1000)) < 2000
+start_time = time.monotonic()
+serialize_local_vars({f'var_{idx}': SlowToPrint() for idx in range(10)}, max_seconds=0.3)
+assert time.monotonic() - start_time < 1
@@ -0,0 +1,61 @@
+import gc
+import time
+import weakref
+
+from crashless.cts import SNAPSHOT_LOCALS_MAX_CHARS, SNAPSHOT_LOCALS_MAX_SECONDS
+from crashless.snapshot import take_snapshot, EMPTY_LOCAL_VARS_STR
+
+
+class Person:
+    def __init__(self, age):
+        self.age = age
+
+
+def crash(person):
+    return person.age + 'years'
+
+
+person = Person(age=10)
+person_ref = weakref.ref(person)
+try:
+    crash(person)
+except TypeError as e:
+    snapshot = take_snapshot(e)
+
+# Locals are text and classes, the frames and the values themselves are not referenced.
+del person
+gc.collect()
+assert person_ref() is None
+
+frame = snapshot.user_frames[-1]
+assert frame.function_name == 'crash'
+assert frame.module_name == '__main__'
+assert 'person' in frame.local_vars_str
+assert Person in frame.local_classes
+assert snapshot.exception_name == 'builtins.TypeError'
+assert 'TypeError' in snapshot.stacktrace_str
+assert snapshot.fingerprint
+
+
+def recurse(depth, payload):
+    if depth == 0:
+        raise ValueError('bottom')
+    return recurse(depth - 1, payload)
+
+
+# One budget for the locals of the whole snapshot, deep recursions don't multiply it. The crash site goes first.
+try:
+    recurse(900, payload='x' * 1000)
+except ValueError as e:
+    start = time.perf_counter()
+    deep_snapshot = take_snapshot(e)
+    elapsed = time.perf_counter() - start
+
+deep_frames = deep_snapshot.user_frames
+assert len(deep_frames) == 902  # the module and the recursion
+serialized_frames = [frame for frame in deep_frames if frame.local_vars_str != EMPTY_LOCAL_VARS_STR]
+assert 10 < len(serialized_frames) < 100
+assert sum(len(frame.local_vars_str) for frame in serialized_frames) < SNAPSHOT_LOCALS_MAX_CHARS * 1.1  # and quotes.
+assert "'depth': '0'" in deep_frames[-1].local_vars_str
+assert deep_frames[0].local_vars_str == EMPTY_LOCAL_VARS_STR
+assert elapsed < SNAPSHOT_LOCALS_MAX_SECONDS + 0.5
@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+from crashless.sources import SourceCache, MEMORY_PER_SOURCE_CHAR
+
+
+def write(path, code, mtime_ns=None):
+    with open(path, 'w') as file:
+        file.write(code)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+with tempfile.TemporaryDirectory() as directory:
+    main_path = os.path.join(directory, 'main.py')
+    write(main_path, 'a = 1\n', mtime_ns=1_000_000_000)
+
+    # Parsed once while the file doesn't change.
+    cache = SourceCache()
+    source_file = cache.get(main_path)
+    assert cache.get(main_path) is source_file
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # A new modification time, or a new size with the same modification time, parses it again.
+    write(main_path, 'a = 2\n', mtime_ns=2_000_000_000)
+    changed_source_file = cache.get(main_path)
+    assert changed_source_file is not source_file and changed_source_file.content == 'a = 2\n'
+    write(main_path, 'a = 30\n', mtime_ns=2_000_000_000)
+    assert cache.get(main_path).content == 'a = 30\n'
+    assert cache.misses == 3 and len(cache.entries) == 1
+    assert cache.memory_size == len('a = 30\n') * MEMORY_PER_SOURCE_CHAR
+
+    # The least recently used files are evicted over the memory cap, the last one is always kept.
+    paths = [os.path.join(directory, f'module_{idx}.py') for idx in range(3)]
+    for path in paths:
+        write(path, 'b = 1\n' * 10)
+    file_memory_size = 60 * MEMORY_PER_SOURCE_CHAR
+    cache = SourceCache(max_memory_size=2 * file_memory_size)
+    cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])  # now paths[1] is the least recently used.
+    cache.get(paths[2])
+    assert list(cache.entries) == [paths[0], paths[2]] and cache.memory_size == 2 * file_memory_size
+
+    cache = SourceCache(max_memory_size=1)
+    cache.get(paths[0])
+    cache.get(paths[1])
+    assert list(cache.entries) == [paths[1]]
@@ -0,0 +1,81 @@
+import os
+import gzip
+import tempfile
+
+from crashless import cli
+from crashless.handler import Solution, CodeFix, Payload, Environment, get_solution_from_code_fix
+from crashless.spool import Spool, read_segment
+
+
+def get_record(fingerprint, size=10):
+    return {'fingerprint': fingerprint, 'attempts': 0, 'payload': {'code': os.urandom(size).hex()}}
+
+
+with tempfile.TemporaryDirectory() as spool_dir:
+    # Records are appended as gzip members, segments rotate when they reach their max size.
+    spool = Spool(spool_dir, segment_max_bytes=1, max_bytes=10_000_000)
+    spool.append(get_record('a'))
+    spool.append(get_record('b'))
+    segment_paths = spool.get_segment_paths()
+    assert len(segment_paths) == 2
+    assert [record['fingerprint'] for path in segment_paths for record in read_segment(path)] == ['a', 'b']
+
+    # A record cut while it was written ends the segment, the previous ones are kept.
+    with open(segment_paths[-1], 'ab') as file:
+        file.write(gzip.compress(b'{"fingerprint": "c"}\n')[:10])
+    assert [record['fingerprint'] for record in read_segment(segment_paths[-1])] == ['b']
+
+with tempfile.TemporaryDirectory() as spool_dir:
+    # The oldest segments are deleted when the spool takes more than its max size.
+    spool = Spool(spool_dir, segment_max_bytes=1, max_bytes=2_000)
+    for idx in range(10):
+        spool.append(get_record(str(idx), size=5_000))
+    remaining = [record['fingerprint'] for path in spool.get_segment_paths() for record in read_segment(path)]
+    assert remaining[-1] == '9' and len(remaining) < 10
+
+with tempfile.TemporaryDirectory() as spool_dir:
+    # Replay sends each fingerprint once, failed ones go back to the spool.
+    spool = Spool(spool_dir)
+    for fingerprint in ['ok', 'ok', 'fails', 'ok']:
+        spool.append(get_record(fingerprint))
+
+    sent_fingerprints = []
+
+    def get_record_solution(record):
+        sent_fingerprints.append(record['fingerprint'])
+        if record['fingerprint'] == 'fails':
+            return Solution(error='backend is down')
+        return Solution(explanation='explanation')
+
+    cli.get_record_solution = get_record_solution
+    assert cli.get_unique_records(get_record(f) for f in ['a', 'b', 'a'])[1] == {'a': 2, 'b': 1}
+    assert cli.replay(spool) == (2, 1)
+    assert sorted(sent_fingerprints) == ['fails', 'ok']
+
+    remaining = [record for path in spool.get_segment_paths() for record in read_segment(path)]
+    assert [(record['fingerprint'], record['attempts']) for record in remaining] == [('fails', 1)]
+    assert not [name for name in os.listdir(spool_dir) if name.endswith('.replaying')]
+
+with tempfile.TemporaryDirectory() as directory:
+    # A replayed fix is applied where its code is now, and refused when the code isn't there anymore.
+    file_path = os.path.join(directory, 'main.py')
+    crash_code = 'import os\n\n\ndef crash():\n    return 8 + \'7\'\n'
+    environment = Environment(index=0, file_path=file_path, code="def crash():\n    return 8 + '7'",
+                              start_scope_index=3, end_scope_index=4, error_code_line="    return 8 + '7'",
+                              local_vars='{}', error_line_number=5, total_file_lines=6, used_additional_definitions=[])
+    payload = Payload(packages=[], stacktrace_str='', environments=[environment], additional_definitions={})
+    code_fix = CodeFix(index=0, file_path=file_path, fixed_code="def crash():\n    return 8 + int('7')",
+                       explanation='explanation')
+
+    def get_replayed_solution(code):
+        with open(file_path, 'w', newline='') as file:
+            file.write(code)
+        return get_solution_from_code_fix(payload, code_fix)
+
+    assert get_replayed_solution(crash_code).new_code == crash_code.replace("'7'", "int('7')")
+    moved_solution = get_replayed_solution(crash_code[len('import os\n\n\n'):])  # lines above were deleted.
+    assert moved_solution.new_code == "def crash():\n    return 8 + int('7')\n" and moved_solution.error is None
+    crlf_solution = get_replayed_solution(crash_code.replace('\n', '\r\n'))  # keeps its line ends.
+    assert crlf_solution.new_code == crash_code.replace("'7'", "int('7')").replace('\n', '\r\n')
+    stale_solution = get_replayed_solution(crash_code.replace("'7'", "'8'"))
+    assert stale_solution.diffs == [] and 'changed since the crash' in stale_solution.error
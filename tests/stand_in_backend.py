@@ -0,0 +1,125 @@
+import sys
+import gzip
+import json
+import time
+import random
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from crashless import blobs
+
+CODE_FIX_PATH = '/crashless/get-crash-fix'
+
+
+class StandInBackend(ThreadingHTTPServer):
+    """
+    Local stand-in of the fix backend, for the tests and the load harness. Like a stock server it can't parse gzipped
+    bodies, unless takes_gzip is set. It answers fixes after latency seconds, fails failure_rate of them or the first
+    requests of a path, and stores code blocks by hash for content addressed payloads.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency=0, failure_rate=0, takes_gzip=False, supports_blobs=True, port=0):
+        super().__init__(('127.0.0.1', port), StandInBackendHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.takes_gzip = takes_gzip
+        self.advertises_gzip = takes_gzip
+        self.supports_blobs = supports_blobs
+        self.failures_left = dict()  # path -> requests that fail before it answers.
+        self.status_codes = dict()  # path -> status code it always answers.
+        self.bodies = deque(maxlen=100)
+        self.encodings = deque(maxlen=100)
+        self.idempotency_keys = deque(maxlen=100)
+        self.stored_blobs = dict()
+        self.received_blobs = []
+        self.requests = 0
+        self.failures = 0
+        self.received_bytes = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):  # clients that timed out leave, that's expected.
+            super().handle_error(request, client_address)
+
+
+class StandInBackendHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('content-length', 0)))
+        content_encoding = self.headers.get('content-encoding')
+        with server.lock:
+            server.requests += 1
+            server.received_bytes += len(body)
+            server.encodings.append(content_encoding)
+            server.idempotency_keys.append(self.headers.get('idempotency-key'))
+
+        if content_encoding == 'gzip':
+            if not server.takes_gzip:
+                return self.respond(400, {'detail': 'There was an error parsing the body'})
+            body = gzip.decompress(body)
+        data = json.loads(body)
+        server.bodies.append(data)
+        if self.path in server.status_codes:
+            return self.respond(server.status_codes[self.path], {'detail': 'Not allowed'})
+
+        is_blobs_path = self.path in (blobs.MISSING_BLOBS_PATH, blobs.CRASH_FIX_BY_HASH_PATH)
+        if is_blobs_path and not server.supports_blobs:
+            return self.respond(404, {'detail': 'Not Found'})
+
+        with server.lock:
+            is_failure = server.failures_left.get(self.path, 0) > 0
+            if is_failure:
+                server.failures_left[self.path] -= 1
+        if is_failure:
+            return self.respond(503, {'detail': 'Try later'})
+
+        if self.path == blobs.MISSING_BLOBS_PATH:
+            return self.respond(200, {'missing': [h for h in data['hashes'] if h not in server.stored_blobs]})
+
+        if self.path == blobs.CRASH_FIX_BY_HASH_PATH:
+            server.received_blobs.append(data['blobs'])
+            server.stored_blobs.update(data['blobs'])
+            codes = [server.stored_blobs[e['code_hash']] for e in data['environments']]
+            return self.respond(200, {'explanation': ' '.join(codes)})
+
+        time.sleep(server.latency)
+        if random.random() < server.failure_rate:
+            with server.lock:
+                server.failures += 1
+            return self.respond(503, {'detail': 'Service Unavailable'})
+
+        environments = data.get('environments') if isinstance(data, dict) else None
+        self.respond(200, {
+            'file_path': environments[-1].get('file_path') if environments else None,
+            'explanation': 'Stand-in explanation.',
+            'connection_port': self.client_address[1],
+        })
+
+    def respond(self, status_code, content):
+        response = json.dumps(content).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(response)))
+        if self.server.advertises_gzip:
+            self.send_header('accept-encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,72 @@
+import os
+import io
+import tempfile
+import contextlib
+import multiprocessing
+
+from crashless import store as store_module
+from crashless.cache import FixCache
+from crashless.store import SQLiteStore, get_store
+
+
+def claim(path, fingerprint, results):
+    results.put(SQLiteStore(path).claim(fingerprint) is not None)
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as store_dir:
+        path = os.path.join(store_dir, 'store.sqlite3')
+        store = SQLiteStore(path, max_fixes=2, dedupe_ttl=60)
+
+        # Only one of many processes claims a crash.
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=claim, args=(path, 'crash', results)) for _ in range(8)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        assert sorted(results.get() for _ in processes) == [False] * 7 + [True]
+
+        # A failed analysis releases the crash, a done one keeps it for the dedupe time.
+        owner = store.claim('other crash')
+        assert owner is not None and store.claim('other crash') is None
+        store.release('other crash', owner, is_done=False)
+        owner = store.claim('other crash')
+        assert owner is not None
+        store.release('other crash', owner, is_done=True)
+        assert store.claim('other crash') is None
+
+        # Claims expire.
+        short_store = SQLiteStore(path, claim_ttl=0)
+        assert short_store.claim('expiring crash') is not None
+        assert short_store.claim('expiring crash') is not None
+
+        # Fixes are shared by the processes, and the least recently used are evicted.
+        store.set('a', {'explanation': 'a'})
+        store.set('b', {'explanation': 'b'})
+        assert SQLiteStore(path).get('a') == {'explanation': 'a'}
+        store.set('c', {'explanation': 'c'})
+        assert store.get('b') is None
+        assert store.get('a') is not None and store.get('c') is not None
+
+        # It backs a fix cache, so a process gets the fixes of the others.
+        FixCache(backing_store=store).set('d', {'explanation': 'd'})
+        assert FixCache(backing_store=SQLiteStore(path)).get('d') == {'explanation': 'd'}
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        # A store that can't be opened is tried again after the retry interval, not on every crash, and its error is
+        # printed once.
+        blocker_path = os.path.join(store_dir, 'blocker')
+        open(blocker_path, 'w').close()
+        store_module.STORE_PATH = os.path.join(blocker_path, 'store.sqlite3')  # a file where its directory should be.
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            assert [get_store() for _ in range(3)] == [None] * 3
+            store_module._store_retry_at = 0
+            assert get_store() is None
+        assert output.getvalue().count('could not open the store') == 1
+
+        os.remove(blocker_path)
+        assert get_store() is None  # until the retry interval passes.
+        store_module._store_retry_at = 0
+        assert isinstance(get_store(), SQLiteStore) and get_store() is get_store()